@@ -731,7 +731,7 @@ def api_embedding_status(request, document_id):
                     if status == 'completed':
                         # Check for actual embeddings
                         check_response = requests.get(
-                            f"{settings.DATABASE_SERVICE_URL}/api/rag/embeddings/?document={document_id}",
+                            f"{settings.DATABASE_SERVICE_URL}/api/rag/embeddings/?document={document_id}&light=true",
                             headers=db_headers
                         )
                         if check_response.status_code == 200:
@@ -783,7 +783,7 @@ def api_embedding_status(request, document_id):
         
         # If no job found, check if embeddings exist
         check_response = requests.get(
-            f"{settings.DATABASE_SERVICE_URL}/api/rag/embeddings/?document={document_id}",
+            f"{settings.DATABASE_SERVICE_URL}/api/rag/embeddings/?document={document_id}&light=true",
             headers=db_headers
         )
         
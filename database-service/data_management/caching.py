@@ -0,0 +1,308 @@
+"""Cache key helpers shared by the views that populate the cache and the
+signal handlers that invalidate it, plus a two-tier (process-local L1 in
+front of Redis) read path for hot keys.
+
+Cached responses are stored as rendered JSON bytes so a hit is returned
+without running serializers or the renderer again.
+
+Invalidations are broadcast on a Redis pub/sub channel so every worker
+process drops its L1 copy, not just the one that handled the write.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import DatabaseError, connection, connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .renderers import ORJSONRenderer
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache_invalidate"
+
+STATISTICS_CACHE_KEY = "database_statistics_json"
+USER_STATISTICS_CACHE_KEY = "user_stats:v1"
+LANGUAGE_LIST_CACHE_KEY = "languages:list:v1"
+ROLE_LIST_CACHE_KEY = "roles:list:v1"
+MEDICAL_RECORD_TYPE_LIST_CACHE_KEY = "medical_record_types:list:v1"
+HEALTH_CHECK_PROBE_KEY = "health_check_probe"
+
+
+def user_email_key(email):
+    return f"user_email_json_{email}"
+
+
+def chat_sessions_key(patient_id):
+    return f"chat_sessions_json_{patient_id}"
+
+
+def encryption_key_key(user_id):
+    return f"encryption_key_json_{user_id}"
+
+
+def refresh_token_key(token):
+    # Hashed so raw tokens never end up in Redis key names
+    return f"refresh_token_json_{hashlib.sha256(token.encode()).hexdigest()}"
+
+
+def refresh_token_revoked_key(token):
+    return f"refresh_token_revoked_{hashlib.sha256(token.encode()).hexdigest()}"
+
+
+def refresh_token_epoch_key(user_id):
+    return f"refresh_token_epoch_{user_id}"
+
+
+CANCER_TYPE_TREE_VERSION_KEY = "cancer_type_tree_version"
+
+
+def cancer_type_tree_key(pk):
+    # Trees are keyed by a version counter that any cancer type write bumps,
+    # since one edit can change every ancestor's subtree
+    version = cache.get_or_set(CANCER_TYPE_TREE_VERSION_KEY, 1, None)
+    return f"cancer_type_tree_{version}_{pk}"
+
+
+def bump_cancer_type_tree_version():
+    try:
+        cache.incr(CANCER_TYPE_TREE_VERSION_KEY)
+    except ValueError:
+        cache.set(CANCER_TYPE_TREE_VERSION_KEY, 1, None)
+
+
+def render_json(data):
+    return ORJSONRenderer().render(data)
+
+
+def json_response(payload, status=200, request=None):
+    """
+    Wrap rendered JSON bytes in a response. When ``request`` is given the
+    response carries an ETag and a matching If-None-Match yields a bodiless
+    304 instead.
+    """
+    if request is None:
+        return HttpResponse(payload, content_type='application/json', status=status)
+
+    etag = quote_etag(hashlib.sha1(payload).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(payload, content_type='application/json', status=status)
+    response.headers['ETag'] = etag
+    return response
+
+
+def streaming_json_response(rows):
+    """
+    Stream ``rows`` as a JSON array, rendering each row as it is pulled, so
+    a large result (e.g. a ``values().iterator()`` queryset read through a
+    server-side cursor) is never held in memory in full.
+    """
+    def stream():
+        yield b'['
+        separator = b''
+        for row in rows:
+            yield separator + render_json(row)
+            separator = b','
+        yield b']'
+
+    return StreamingHttpResponse(stream(), content_type='application/json')
+
+
+_listener_lock = threading.Lock()
+_listener_pid = None
+
+
+def _listen_for_invalidations():
+    from django_redis import get_redis_connection
+
+    while True:
+        try:
+            pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            for message in pubsub.listen():
+                caches['local'].delete_many(json.loads(message['data']))
+        except Exception as e:
+            logger.warning(f"Cache invalidation listener disconnected: {e}")
+            time.sleep(1)
+
+
+def _ensure_invalidation_listener():
+    """Start this process's subscriber thread (once per pid, so forks get their own)."""
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        try:
+            from django_redis import get_redis_connection
+            get_redis_connection('default')
+        except Exception:
+            # Non-Redis cache backend: there is nothing to subscribe to
+            _listener_pid = os.getpid()
+            return
+        threading.Thread(target=_listen_for_invalidations, daemon=True,
+                         name='cache-invalidation-listener').start()
+        _listener_pid = os.getpid()
+
+
+def tiered_get(key, local_timeout):
+    """Read from the local cache, falling back to Redis and warming L1."""
+    _ensure_invalidation_listener()
+    local_cache = caches['local']
+    value = local_cache.get(key)
+    if value is None:
+        value = cache.get(key)
+        if value is not None:
+            local_cache.set(key, value, local_timeout)
+    return value
+
+
+def tiered_set(key, value, timeout, local_timeout):
+    cache.set(key, value, timeout)
+    caches['local'].set(key, value, local_timeout)
+
+
+def tiered_delete_many(keys):
+    keys = list(keys)
+    cache.delete_many(keys)
+    caches['local'].delete_many(keys)
+    try:
+        from django_redis import get_redis_connection
+        get_redis_connection('default').publish(INVALIDATION_CHANNEL, json.dumps(keys))
+    except Exception as e:
+        logger.debug(f"Cache invalidation not broadcast: {e}")
+
+
+def _store(key, value, timeout, local_timeout):
+    if local_timeout:
+        tiered_set(key, value, timeout, local_timeout)
+    else:
+        cache.set(key, value, timeout)
+    cache.set(f"{key}:stale", value, timeout * 2)
+
+
+def _refresh_in_background(key, compute, timeout, local_timeout, lock_key):
+    def run():
+        try:
+            _store(key, compute(), timeout, local_timeout)
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed: {e}")
+        finally:
+            cache.delete(lock_key)
+            # Connections are per thread; do not leave this one open
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True, name=f'cache-refresh-{key}').start()
+
+
+def get_or_compute(key, compute, timeout, local_timeout=None, lock_timeout=10,
+                   refresh_in_background=False):
+    """
+    Return the cached value for ``key`` or compute and store it, letting
+    only one worker recompute an expired entry at a time.
+
+    Workers that lose the race for ``<key>:lock`` are served the last
+    computed value from the longer-lived ``<key>:stale`` copy instead of
+    running the same query concurrently. Only a cold cache (no stale copy
+    yet) falls through to computing without the lock.
+
+    If recomputing fails with a database error the stale copy is served
+    instead, so a slow or unavailable database degrades these reads to
+    slightly old data rather than errors.
+
+    With ``refresh_in_background`` the lock holder is also served the stale
+    copy while a thread recomputes, so no request waits on the query once
+    the cache is warm. Only use it where a just-written change may show up
+    a moment late.
+    """
+    if local_timeout:
+        value = tiered_get(key, local_timeout)
+    else:
+        value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    stale_key = f"{key}:stale"
+    if not cache.add(lock_key, 1, lock_timeout):
+        value = cache.get(stale_key)
+        if value is not None:
+            return value
+        return compute()
+
+    if refresh_in_background:
+        value = cache.get(stale_key)
+        if value is not None:
+            _refresh_in_background(key, compute, timeout, local_timeout, lock_key)
+            return value
+
+    try:
+        try:
+            value = compute()
+        except DatabaseError as e:
+            value = cache.get(stale_key)
+            if value is None:
+                raise
+            logger.warning(f"Serving stale {key} after database error: {e}")
+            return value
+        _store(key, value, timeout, local_timeout)
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def probe_backends():
+    """
+    Check the database and cache for the health endpoints and return the
+    cache status. Liveness probes arrive every few seconds, so each worker
+    only touches the backends again once its last result has expired.
+    Raises if the database is unreachable.
+    """
+    cache_status = caches['local'].get(HEALTH_CHECK_PROBE_KEY)
+    if cache_status is None:
+        # Reuse the persistent connection if one is open
+        connection.ensure_connection()
+        if not connection.is_usable():
+            raise DatabaseError('Database connection is not usable')
+
+        # A successful write is proof enough that the cache is up
+        cache_status = 'connected'
+        try:
+            cache.set('health_check', 'ok', 10)
+        except Exception:
+            cache_status = 'disconnected'
+        caches['local'].set(HEALTH_CHECK_PROBE_KEY, cache_status, settings.HEALTH_CHECK_PROBE_TTL)
+    return cache_status
+
+
+@lru_cache(maxsize=None)
+def healthy_body(cache_status, auth_type=None):
+    # Only a handful of (cache, auth) combinations exist, so each body is
+    # rendered once per worker rather than on every probe
+    body = {
+        'status': 'healthy',
+        'service': 'database-service',
+        'database': 'connected',
+        'cache': cache_status,
+    }
+    if auth_type is not None:
+        body.update({'authenticated': True, 'auth_type': auth_type})
+    return render_json(body)
+
+
+def unhealthy_response(error, status):
+    return json_response(render_json({
+        'status': 'unhealthy',
+        'service': 'database-service',
+        'error': str(error)
+    }), status=status)
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+import logging
+import time
+
+from data_management.tokens import EXPIRED_TOKEN_DELETE_BATCH_SIZE, delete_expired_refresh_tokens, rebuild_token_filter
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Periodically delete expired refresh tokens in small batches and rebuild the token filter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=60 * 60,
+                            help='Seconds to sleep between sweeps')
+        parser.add_argument('--batch-size', type=int, default=EXPIRED_TOKEN_DELETE_BATCH_SIZE,
+                            help='Tokens deleted per statement')
+        parser.add_argument('--once', action='store_true',
+                            help='Run a single sweep and exit')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Token cleanup worker started'))
+        while True:
+            try:
+                count = delete_expired_refresh_tokens(batch_size=options['batch_size'])
+                if count:
+                    logger.info(f"Deleted {count} expired refresh tokens")
+            except Exception as e:
+                logger.error(f"Failed to delete expired refresh tokens: {str(e)}")
+            try:
+                # Drops revoked and expired tokens from the filter
+                count = rebuild_token_filter()
+                logger.info(f"Rebuilt refresh token filter with {count} tokens")
+            except Exception as e:
+                logger.error(f"Failed to rebuild refresh token filter: {str(e)}")
+            close_old_connections()
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
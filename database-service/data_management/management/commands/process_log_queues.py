@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+import logging
+import time
+
+from data_management.write_behind import QUEUE_MODELS, drain, flush_last_accessed
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Drain queued event and file access log entries and file access times into the database in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queues are empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queues once and exit')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Log queue worker started'))
+        while True:
+            for queue in QUEUE_MODELS:
+                try:
+                    while drain(queue):
+                        pass
+                except Exception as e:
+                    logger.error(f"Failed to drain {queue}: {str(e)}")
+                    close_old_connections()
+            try:
+                while flush_last_accessed():
+                    pass
+            except Exception as e:
+                logger.error(f"Failed to flush file last_accessed times: {str(e)}")
+                close_old_connections()
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
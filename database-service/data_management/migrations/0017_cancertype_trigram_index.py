@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:00
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0016_suggestedhistory_suggestiontemplate'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='cancertype',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['cancer_type'], name='cancer_type_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0017_cancertype_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'timestamp'], name='chat_message_session_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['patient', '-created_at'], name='chat_session_patient_idx'),
+        ),
+    ]
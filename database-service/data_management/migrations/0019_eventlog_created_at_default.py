@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0018_chat_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='eventlog',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0019_eventlog_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicalrecordaccess',
+            index=models.Index(condition=models.Q(('revoked_at__isnull', True)), fields=['user', 'expires_at'], name='record_access_active_user_idx'),
+        ),
+    ]
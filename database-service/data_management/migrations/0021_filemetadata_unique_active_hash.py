@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:16
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_active_hashes(apps, schema_editor):
+    # Duplicates were allowed before this constraint. Which copy to keep is a
+    # decision about patient files, so refuse to guess and say what to fix
+    FileMetadata = apps.get_model('data_management', 'FileMetadata')
+    duplicates = list(
+        FileMetadata.objects.using(schema_editor.connection.alias)
+        .filter(is_deleted=False)
+        .values('file_hash')
+        .annotate(copies=Count('id'))
+        .filter(copies__gt=1)
+        .values_list('file_hash', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            'Cannot add file_hash_active_uniq: these file hashes have more than one '
+            'active (is_deleted=false) file_metadata row. Soft-delete the extra copies '
+            'and rerun the migration: ' + ', '.join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0020_medicalrecordaccess_active_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_active_hashes, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='filemetadata',
+            name='file_metada_file_ha_ae2673_idx',
+        ),
+        migrations.AlterField(
+            model_name='filemetadata',
+            name='file_hash',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='filemetadata',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_deleted', False)), fields=('file_hash',), name='file_hash_active_uniq'),
+        ),
+    ]
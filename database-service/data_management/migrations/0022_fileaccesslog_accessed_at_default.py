@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0021_filemetadata_unique_active_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fileaccesslog',
+            name='accessed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
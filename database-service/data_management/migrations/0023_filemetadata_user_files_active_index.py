@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0022_fileaccesslog_accessed_at_default'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='filemetadata',
+            name='file_metada_user_id_079911_idx',
+        ),
+        migrations.AddIndex(
+            model_name='filemetadata',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['user', '-uploaded_at'], name='user_files_active_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0023_filemetadata_user_files_active_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='filemetadata',
+            index=models.Index(fields=['-uploaded_at', 'id'], name='file_uploaded_at_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0024_filemetadata_uploaded_at_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='refreshtoken',
+            index=models.Index(fields=['expires_at'], name='refresh_token_expires_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='refreshtoken',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user'], name='refresh_token_active_user_idx'),
+        ),
+    ]
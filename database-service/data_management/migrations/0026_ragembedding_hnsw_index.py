@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0025_refreshtoken_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            # HNSW needs no training data, unlike the ivfflat index that was
+            # built with 100 lists over a then-empty table
+            sql="""
+                DROP INDEX IF EXISTS rag_embeddings_vector_idx;
+                
+                CREATE INDEX rag_embeddings_vector_hnsw_idx 
+                ON rag_embeddings 
+                USING hnsw (embedding_vector vector_cosine_ops);
+            """,
+            reverse_sql="""
+                DROP INDEX IF EXISTS rag_embeddings_vector_hnsw_idx;
+                
+                CREATE INDEX rag_embeddings_vector_idx 
+                ON rag_embeddings 
+                USING ivfflat (embedding_vector vector_cosine_ops)
+                WITH (lists = 100);
+            """,
+        ),
+    ]
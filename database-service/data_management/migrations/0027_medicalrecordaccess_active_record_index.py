@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0026_ragembedding_hnsw_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='medicalrecordaccess',
+            name='medical_rec_medical_36c4d0_idx',
+        ),
+        migrations.AddIndex(
+            model_name='medicalrecordaccess',
+            index=models.Index(condition=models.Q(('revoked_at__isnull', True)), fields=['medical_record', 'expires_at'], name='record_access_active_rec_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0027_medicalrecordaccess_active_record_index'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='medicalrecord',
+            unique_together=set(),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0028_medicalrecord_drop_redundant_unique'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ragembeddingjob',
+            name='rag_embeddi_documen_3dd1e5_idx',
+        ),
+        migrations.AddIndex(
+            model_name='ragembeddingjob',
+            index=models.Index(fields=['document', '-created_at'], name='embedding_job_document_idx'),
+        ),
+    ]
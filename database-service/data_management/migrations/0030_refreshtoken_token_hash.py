@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0029_ragembeddingjob_document_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='token_hash',
+            field=models.BinaryField(editable=False, max_length=32, null=True),
+        ),
+        migrations.RunSQL(
+            # sha256() is built into Postgres 11+, no pgcrypto needed
+            sql="UPDATE refresh_tokens SET token_hash = sha256(convert_to(token, 'UTF8'));",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='refreshtoken',
+            name='token_hash',
+            field=models.BinaryField(editable=False, max_length=32, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='refreshtoken',
+            name='token',
+            field=models.CharField(max_length=255),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0030_refreshtoken_token_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='refreshtoken',
+            name='token_hash',
+            field=models.BinaryField(max_length=32),
+        ),
+        migrations.AddConstraint(
+            model_name='refreshtoken',
+            constraint=models.UniqueConstraint(fields=('token_hash',), include=('is_active', 'expires_at'), name='refresh_token_hash_uniq'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.utils import timezone
+import hashlib
 import uuid
 
 
@@ -128,6 +130,8 @@ class CancerType(models.Model):
         indexes = [
             models.Index(fields=['cancer_type']),
             models.Index(fields=['parent']),
+            # Trigram index so the `search` filter's icontains can avoid a seq scan
+            GinIndex(fields=['cancer_type'], name='cancer_type_name_trgm_idx', opclasses=['gin_trgm_ops']),
         ]
         
     def __str__(self):
@@ -156,7 +160,8 @@ class EventLog(models.Model):
     event_type = models.CharField(max_length=100)
     service = models.CharField(max_length=50)
     data = models.JSONField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: queued rows carry the time they were logged
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         db_table = 'event_logs'
@@ -184,7 +189,7 @@ class FileMetadata(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='files')
     filename = models.CharField(max_length=255)
-    file_hash = models.CharField(max_length=64, db_index=True)
+    file_hash = models.CharField(max_length=64)
     file_size = models.BigIntegerField()
     mime_type = models.CharField(max_length=100)
     storage_path = models.CharField(max_length=500)
@@ -198,8 +203,19 @@ class FileMetadata(models.Model):
         db_table = 'file_metadata'
         ordering = ['-uploaded_at']
         indexes = [
-            models.Index(fields=['user', '-uploaded_at']),
-            models.Index(fields=['file_hash']),
+            # Upload-date ordering, also walked by the RAG document cursor
+            models.Index(fields=['-uploaded_at', 'id'], name='file_uploaded_at_idx'),
+            # user_files lists a user's live files newest first
+            models.Index(fields=['user', '-uploaded_at'], condition=models.Q(is_deleted=False), name='user_files_active_idx'),
+        ]
+        constraints = [
+            # At most one live file per content hash; serves the duplicate
+            # check and makes create_metadata's get_or_create race-free
+            models.UniqueConstraint(
+                fields=['file_hash'],
+                condition=models.Q(is_deleted=False),
+                name='file_hash_active_uniq',
+            ),
         ]
     
     def __str__(self):
@@ -256,7 +272,8 @@ class FileAccessLog(models.Model):
     file = models.ForeignKey(FileMetadata, on_delete=models.CASCADE, related_name='access_logs')
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     access_type = models.CharField(max_length=20, choices=ACCESS_TYPE_CHOICES)
-    accessed_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: queued rows carry the time of the access
+    accessed_at = models.DateTimeField(default=timezone.now, editable=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.CharField(max_length=500, null=True, blank=True)
     success = models.BooleanField(default=True)
@@ -288,9 +305,15 @@ class RAGDocument(models.Model):
         return f"{self.file.filename} - {self.cancer_type}"
 
 
+def refresh_token_hash(token):
+    return hashlib.sha256(token.encode()).digest()
+
+
 class RefreshToken(models.Model):
     id = models.BigAutoField(primary_key=True)
-    token = models.CharField(max_length=255, unique=True)
+    token = models.CharField(max_length=255)
+    # Lookups go through this 32-byte digest rather than indexing the token
+    token_hash = models.BinaryField(max_length=32, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     is_active = models.BooleanField(default=True)
@@ -298,15 +321,33 @@ class RefreshToken(models.Model):
     
     class Meta:
         db_table = 'refresh_tokens'
+        constraints = [
+            # Carries the validity columns so the detail=false probe is an
+            # index-only scan
+            models.UniqueConstraint(
+                fields=['token_hash'], include=['is_active', 'expires_at'], name='refresh_token_hash_uniq'
+            ),
+        ]
+        indexes = [
+            # Expired-token sweep
+            models.Index(fields=['expires_at'], name='refresh_token_expires_idx'),
+            # invalidate_user_tokens only touches a user's live tokens
+            models.Index(fields=['user'], condition=models.Q(is_active=True), name='refresh_token_active_user_idx'),
+        ]
     
     def __str__(self):
         return f"Token for {self.user.email}"
+    
+    def save(self, *args, **kwargs):
+        if not self.token_hash:
+            self.token_hash = refresh_token_hash(self.token)
+        super().save(*args, **kwargs)
 
 
 class MedicalRecord(models.Model):
     """
     Medical records linking files to patients with record types.
-    Uses composite primary key of file, patient, and record type.
+    Keyed by file: each file belongs to exactly one record.
     """
     file = models.OneToOneField(FileMetadata, on_delete=models.CASCADE, primary_key=True, related_name='medical_record')
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='medical_records')
@@ -318,7 +359,6 @@ class MedicalRecord(models.Model):
     
     class Meta:
         db_table = 'medical_records'
-        unique_together = [['file', 'patient', 'medical_record_type']]
         indexes = [
             models.Index(fields=['patient']),
             models.Index(fields=['medical_record_type']),
@@ -348,7 +388,20 @@ class MedicalRecordAccess(models.Model):
         unique_together = [['medical_record', 'user']]
         indexes = [
             models.Index(fields=['user', '-granted_at']),
-            models.Index(fields=['medical_record', 'user']),
+            # Partial indexes for the default active_only listing; revoked grants
+            # accumulate over time and are excluded so the indexes stay small
+            models.Index(
+                fields=['user', 'expires_at'],
+                condition=models.Q(revoked_at__isnull=True),
+                name='record_access_active_user_idx',
+            ),
+            # Active grants of one record (medical_record_id filter). Exact
+            # (medical_record, user) lookups use the unique_together index
+            models.Index(
+                fields=['medical_record', 'expires_at'],
+                condition=models.Q(revoked_at__isnull=True),
+                name='record_access_active_rec_idx',
+            ),
         ]
     
     def __str__(self):
@@ -414,7 +467,9 @@ class RAGEmbeddingJob(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['status', '-created_at']),
-            models.Index(fields=['document']),
+            # The admin polls a document's latest job (?document=&ordering=-created_at);
+            # also serves the document foreign key
+            models.Index(fields=['document', '-created_at'], name='embedding_job_document_idx'),
         ]
     
     def __str__(self):
@@ -430,6 +485,9 @@ class ChatSession(models.Model):
     class Meta:
         db_table = 'chat_sessions'
         ordering = ['-created_at']  # Newest first
+        indexes = [
+            models.Index(fields=['patient', '-created_at'], name='chat_session_patient_idx'),
+        ]
     
     def __str__(self):
         return f"Chat Session {self.id}"
@@ -444,6 +502,9 @@ class ChatMessage(models.Model):
     class Meta:
         db_table = 'chat_messages'
         ordering = ['timestamp']  # Oldest first
+        indexes = [
+            models.Index(fields=['session', 'timestamp'], name='chat_message_session_ts_idx'),
+        ]
         
     def __str__(self):
         return f"Chat Message {self.id}"
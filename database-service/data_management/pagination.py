@@ -0,0 +1,100 @@
+import hashlib
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+COUNT_CACHE_TTL = 60
+
+
+def count_version_key(model):
+    return f"pgcount_version:{model._meta.label_lower}"
+
+
+def bump_count_version(model):
+    """Invalidate every cached page count for ``model``'s list queries"""
+    try:
+        cache.incr(count_version_key(model))
+    except ValueError:
+        cache.set(count_version_key(model), 1, None)
+
+
+class CachingPaginator(Paginator):
+    """
+    Paginator that caches the COUNT(*) for a query for a minute, so paging
+    through a list does not recount the table on every request. Counts are
+    keyed by the query's SQL and stored with the per-model version that
+    writes bump, so a hit is one MGET of the version and the count.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return super().count
+        model = self.object_list.model
+        version_key = count_version_key(model)
+        digest = hashlib.md5(str(query).encode()).hexdigest()
+        count_key = f"pgcount:{model._meta.label_lower}:{digest}"
+        cached = cache.get_many([version_key, count_key])
+        version = cached.get(version_key)
+        if version is None:
+            cache.add(version_key, 1, None)
+            version = cache.get(version_key, 1)
+        entry = cached.get(count_key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        count = super().count
+        cache.set(count_key, (version, count), COUNT_CACHE_TTL)
+        return count
+
+
+class CachingPageNumberPagination(PageNumberPagination):
+    django_paginator_class = CachingPaginator
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor ("seek") pagination: each page is a bounded range scan on the
+    ordering column instead of an OFFSET, so deep pages cost the same as
+    the first one and no COUNT(*) is issued.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-created_at'
+
+    def get_ordering(self, request, queryset, view):
+        cursor_ordering = getattr(view, 'cursor_ordering', None)
+        if cursor_ordering:
+            return (cursor_ordering,) if isinstance(cursor_ordering, str) else tuple(cursor_ordering)
+        return super().get_ordering(request, queryset, view)
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Page-number pagination that switches to keyset pagination when the
+    client sends a ``cursor`` parameter (an empty ``?cursor=`` requests the
+    first page). Existing callers relying on ``page``/``count`` keep working.
+    """
+    cursor_class = KeysetPagination
+    # Same page size control as keyset mode
+    page_size_query_param = KeysetPagination.page_size_query_param
+    max_page_size = KeysetPagination.max_page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.cursor_class.cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class CachingOptionalCursorPagination(OptionalCursorPagination):
+    """OptionalCursorPagination whose page-number mode caches the COUNT(*)"""
+    django_paginator_class = CachingPaginator
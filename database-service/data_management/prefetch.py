@@ -0,0 +1,96 @@
+"""
+Derive select_related / prefetch_related paths from a serializer's field
+tree so list endpoints do not issue one query per row for nested data.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+_relation_cache = {}
+
+
+def _walk_relations(model, source):
+    """Follow a dotted serializer source through model relations.
+
+    Returns the ORM path of the relations traversed, whether any of them
+    is to-many, the model reached and whether the whole source resolved
+    to a relation.
+    """
+    path, many = [], False
+    for part in source.split('.'):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return path, many, model, False
+        if not field.is_relation or field.name != part:
+            # Plain column, or a relation's *_id attname read without a join
+            return path, many, model, False
+        path.append(part)
+        many = many or field.many_to_many or field.one_to_many
+        model = field.related_model
+    return path, many, model, True
+
+
+def collect_relations(serializer, model, prefix=()):
+    """Return (select_related, prefetch_related) sets for ``serializer``."""
+    selects, prefetches = set(), set()
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        if isinstance(field, serializers.RelatedField) and field.use_pk_only_optimization():
+            # Rendered from the local *_id column
+            continue
+
+        path, many, related_model, resolved = _walk_relations(model, field.source)
+        if isinstance(field, serializers.ManyRelatedField):
+            many = True
+        if not path:
+            continue
+        full_path = '__'.join(prefix + tuple(path))
+        (prefetches if many else selects).add(full_path)
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if resolved and isinstance(nested, serializers.ModelSerializer):
+            nested_selects, nested_prefetches = collect_relations(
+                nested, related_model, prefix + tuple(path)
+            )
+            if many:
+                prefetches |= nested_selects | nested_prefetches
+            else:
+                selects |= nested_selects
+                prefetches |= nested_prefetches
+
+    # Keep only the deepest paths; select_related('a__b') already joins 'a'
+    selects = {p for p in selects if not any(o.startswith(p + '__') for o in selects)}
+    prefetches = {p for p in prefetches if not any(o.startswith(p + '__') for o in prefetches)}
+    return selects, prefetches
+
+
+class AutoPrefetchViewSetMixin:
+    """
+    Apply the relations a viewset's serializer renders to its queryset.
+
+    Relations reached only through SerializerMethodFields cannot be
+    discovered and are declared with ``extra_select_related`` /
+    ``extra_prefetch_related``.
+    """
+    extra_select_related = ()
+    extra_prefetch_related = ()
+
+    def get_queryset(self):
+        return self.optimize_queryset(super().get_queryset())
+
+    def optimize_queryset(self, queryset):
+        serializer_class = self.get_serializer_class()
+        key = (serializer_class, queryset.model)
+        if key not in _relation_cache:
+            _relation_cache[key] = collect_relations(serializer_class(), queryset.model)
+        selects, prefetches = _relation_cache[key]
+
+        selects = sorted(selects) + [s for s in self.extra_select_related if s not in selects]
+        # Extras may be Prefetch objects, so they are appended rather than merged
+        prefetches = sorted(prefetches) + list(self.extra_prefetch_related)
+        if selects:
+            queryset = queryset.select_related(*selects)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
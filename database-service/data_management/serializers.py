@@ -53,7 +53,7 @@ class PatientSerializer(serializers.ModelSerializer):
                     'cancer_subtype': assignment.cancer_subtype.id if assignment.cancer_subtype else None,
                     'cancer_subtype_name': assignment.cancer_subtype.cancer_type if assignment.cancer_subtype else None,
                     'cancer_type_name': assignment.cancer_subtype.parent.cancer_type if (assignment.cancer_subtype and assignment.cancer_subtype.parent) else None,
-                    'assigned_clinician': assignment.assigned_clinician.id if assignment.assigned_clinician else None,
+                    'assigned_clinician': assignment.assigned_clinician_id,
                     'notes': assignment.notes,
                     'created_at': assignment.created_at.isoformat() if assignment.created_at else None,
                     'updated_at': assignment.updated_at.isoformat() if assignment.updated_at else None
@@ -0,0 +1,150 @@
+"""
+Invalidate cached reads when the rows behind them change, so correctness
+does not depend on the cache TTL.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .caching import (
+    LANGUAGE_LIST_CACHE_KEY, MEDICAL_RECORD_TYPE_LIST_CACHE_KEY, ROLE_LIST_CACHE_KEY, STATISTICS_CACHE_KEY,
+    USER_STATISTICS_CACHE_KEY, bump_cancer_type_tree_version, chat_sessions_key, encryption_key_key,
+    tiered_delete_many, user_email_key,
+)
+from .models import (
+    CancerType, ChatMessage, ChatSession, Language, MedicalRecordType, Patient, RAGDocument, RAGEmbedding,
+    RefreshToken, Role, User, UserEncryptionKey,
+)
+from .pagination import bump_count_version
+from .tokens import add_to_token_filter, revoke_cached_refresh_tokens
+
+
+def invalidate(keys):
+    """
+    Drop ``keys`` now and, inside a transaction, again once it commits, so
+    a concurrent read that re-cached the pre-write row in between does not
+    outlive the write.
+    """
+    keys = list(keys)
+    tiered_delete_many(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: tiered_delete_many(keys))
+
+
+@receiver(post_init, sender=User)
+def remember_user_state(sender, instance, **kwargs):
+    # Read from __dict__ so deferred fields are not fetched just for this
+    instance._loaded_email = instance.__dict__.get('email')
+    instance._loaded_role_id = instance.__dict__.get('role_id')
+    instance._loaded_is_active = instance.__dict__.get('is_active')
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_on_save(sender, instance, created, **kwargs):
+    keys = {user_email_key(instance.email)}
+    if instance._loaded_email:
+        keys.add(user_email_key(instance._loaded_email))
+        if instance._loaded_email != instance.email:
+            # Cached token validations carry the user's email
+            transaction.on_commit(lambda: revoke_cached_refresh_tokens(instance.pk))
+    if created or instance._loaded_role_id != instance.role_id:
+        keys.update((STATISTICS_CACHE_KEY, USER_STATISTICS_CACHE_KEY))
+    elif instance._loaded_is_active != instance.is_active:
+        keys.add(USER_STATISTICS_CACHE_KEY)
+    invalidate(keys)
+    instance._loaded_email = instance.email
+    instance._loaded_role_id = instance.role_id
+    instance._loaded_is_active = instance.is_active
+
+
+@receiver(post_delete, sender=User)
+def invalidate_user_on_delete(sender, instance, **kwargs):
+    invalidate([user_email_key(instance.email), STATISTICS_CACHE_KEY, USER_STATISTICS_CACHE_KEY])
+
+
+@receiver(post_delete, sender=User)
+def invalidate_user_refresh_tokens(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: revoke_cached_refresh_tokens(user_id))
+
+
+@receiver(post_save, sender=RefreshToken)
+def add_refresh_token_to_filter(sender, instance, created, **kwargs):
+    # Once committed, so a rebuild that reads the table cannot miss it
+    if created:
+        transaction.on_commit(lambda: add_to_token_filter([instance.token]))
+
+
+@receiver(post_save, sender=Role)
+def invalidate_role_users(sender, instance, created, **kwargs):
+    # by_email embeds the role's name and description in the cached payload
+    if not created:
+        emails = instance.users.values_list('email', flat=True)
+        invalidate([user_email_key(email) for email in emails])
+
+
+@receiver([post_save, post_delete], sender=UserEncryptionKey)
+def invalidate_encryption_key(sender, instance, **kwargs):
+    invalidate([encryption_key_key(instance.user_id)])
+
+
+@receiver(post_save, sender=Patient)
+def invalidate_patient_statistics(sender, instance, created, **kwargs):
+    if created:
+        invalidate([STATISTICS_CACHE_KEY])
+
+
+@receiver(post_delete, sender=Patient)
+def invalidate_patient_statistics_on_delete(sender, instance, **kwargs):
+    invalidate([STATISTICS_CACHE_KEY])
+
+
+@receiver([post_save, post_delete], sender=CancerType)
+def invalidate_cancer_type_trees(sender, instance, **kwargs):
+    bump_cancer_type_tree_version()
+
+
+@receiver([post_save, post_delete], sender=Language)
+def invalidate_language_list(sender, instance, **kwargs):
+    invalidate([LANGUAGE_LIST_CACHE_KEY])
+
+
+@receiver([post_save, post_delete], sender=Role)
+def invalidate_role_list(sender, instance, **kwargs):
+    invalidate([ROLE_LIST_CACHE_KEY])
+
+
+@receiver([post_save, post_delete], sender=MedicalRecordType)
+def invalidate_medical_record_type_list(sender, instance, **kwargs):
+    invalidate([MEDICAL_RECORD_TYPE_LIST_CACHE_KEY])
+
+
+@receiver([post_save, post_delete], sender=RAGDocument)
+def invalidate_rag_document_counts(sender, instance, **kwargs):
+    bump_count_version(RAGDocument)
+
+
+@receiver([post_save, post_delete], sender=RAGEmbedding)
+def invalidate_rag_document_embedding_counts(sender, instance, **kwargs):
+    # ?has_embeddings counts on the document list change with embeddings
+    bump_count_version(RAGDocument)
+
+
+@receiver([post_save, post_delete], sender=ChatSession)
+def invalidate_chat_sessions(sender, instance, **kwargs):
+    invalidate([chat_sessions_key(instance.patient_id)])
+
+
+@receiver([post_save, post_delete], sender=ChatMessage)
+def invalidate_chat_sessions_for_message(sender, instance, **kwargs):
+    if kwargs.get('origin', instance) is not instance:
+        # Cascaded from a session or patient delete, which invalidates itself
+        return
+    # Messages are usually saved by session_id alone, so look up the owner
+    # rather than loading the session
+    if ChatMessage.session.is_cached(instance):
+        patient_id = instance.session.patient_id
+    else:
+        patient_id = ChatSession.objects.filter(pk=instance.session_id).values_list('patient_id', flat=True).first()
+    if patient_id is not None:
+        invalidate([chat_sessions_key(patient_id)])
@@ -0,0 +1,969 @@
+import json
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework.test import APIClient
+
+from . import caching, tokens, write_behind
+from .caching import (
+    HEALTH_CHECK_PROBE_KEY, INVALIDATION_CHANNEL, LANGUAGE_LIST_CACHE_KEY, MEDICAL_RECORD_TYPE_LIST_CACHE_KEY,
+    ROLE_LIST_CACHE_KEY, STATISTICS_CACHE_KEY, USER_STATISTICS_CACHE_KEY, chat_sessions_key, encryption_key_key,
+    get_or_compute, refresh_token_key, tiered_delete_many, tiered_get, tiered_set, user_email_key,
+)
+from .models import (
+    CancerType, ChatMessage, ChatSession, Clinician, EventLog, FileAccessLog, FileMetadata, Language,
+    MedicalRecordType, Patient, PatientAssignment, RAGDocument, RAGEmbedding, RAGEmbeddingJob, RefreshToken,
+    Role, User, UserEncryptionKey, refresh_token_hash,
+)
+from .pagination import bump_count_version
+
+
+class InlineThread:
+    def __init__(self, target, **kwargs):
+        self.target = target
+
+    def start(self):
+        self.target()
+
+
+@contextmanager
+def run_refreshes_inline():
+    """Run get_or_compute's background refreshes on start(), in the test's transaction."""
+    with mock.patch.object(caching.threading, 'Thread', InlineThread), \
+            mock.patch.object(caching.connections, 'close_all'):
+        yield
+
+
+class ServiceClientMixin:
+    """Authenticates as an internal service and creates one patient user."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_SERVICE_TOKEN=settings.SERVICE_TOKEN)
+        self.role = Role.objects.create(name='PATIENT', display_name='Patient')
+        self.user = User.objects.create_user(
+            email='patient@example.com', password='x', first_name='P', last_name='T', role=self.role
+        )
+
+    def create_patient(self, user=None):
+        return Patient.objects.create(
+            user_id=(user or self.user).id, date_of_birth='2000-01-01', gender='FEMALE', phone_number='1', address='a',
+            emergency_contact_name='e', emergency_contact_phone='1',
+        )
+
+    def create_file(self, name='doc', **fields):
+        return FileMetadata.objects.create(
+            user=self.user, filename=name, file_hash=fields.pop('file_hash', name.ljust(64, '0')),
+            file_size=1, mime_type='application/pdf', storage_path=name, **fields
+        )
+
+    def create_document(self, name='doc'):
+        cancer_type = CancerType.objects.get_or_create(cancer_type='Breast')[0]
+        return RAGDocument.objects.create(file=self.create_file(name), cancer_type=cancer_type)
+
+    def walk_cursor_pages(self, url, params):
+        """Follow ``next`` links from the first keyset page; returns every row."""
+        rows = []
+        response = self.client.get(url, {**params, 'cursor': ''})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertNotIn('count', body)
+            rows += body['results']
+            if not body['next']:
+                return rows
+            response = self.client.get(body['next'])
+
+
+class OptionalCursorPaginationTests(ServiceClientMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        document = self.create_document()
+        self.jobs = [RAGEmbeddingJob.objects.create(document=document) for _ in range(5)]
+
+    def test_page_number_mode_without_cursor(self):
+        response = self.client.get('/api/rag/embedding-jobs/')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['count'], 5)
+        self.assertEqual(len(body['results']), 5)
+
+    def test_page_number_mode_honours_page_size(self):
+        body = self.client.get('/api/rag/embedding-jobs/', {'page_size': 2, 'page': 3}).json()
+        self.assertEqual(body['count'], 5)
+        self.assertEqual(len(body['results']), 1)
+        self.assertIsNone(body['next'])
+
+    def test_cursor_switches_to_keyset_pages(self):
+        rows = self.walk_cursor_pages('/api/rag/embedding-jobs/', {'page_size': 2})
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row['id'] for row in rows}, {str(job.id) for job in self.jobs})
+
+
+class RAGEmbeddingListTests(ServiceClientMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.documents = [self.create_document(name) for name in ('first', 'second')]
+        for document in self.documents:
+            for i in (2, 0, 1):
+                RAGEmbedding.objects.create(document=document, chunk_index=i, chunk_text='t', embedding=[0.1])
+
+    def test_document_cursor_pages_follow_chunk_order(self):
+        rows = self.walk_cursor_pages('/api/rag/embeddings/', {'document': self.documents[0].pk, 'page_size': 2})
+        self.assertEqual([row['chunk_index'] for row in rows], [0, 1, 2])
+
+    def test_unscoped_list_stays_paginated(self):
+        body = self.client.get('/api/rag/embeddings/').json()
+        self.assertEqual(body['count'], 6)
+        self.assertEqual(len(self.walk_cursor_pages('/api/rag/embeddings/', {'page_size': 4})), 6)
+
+
+class CacheInvalidationTests(ServiceClientMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Start from, and leave behind, a cold cache for the keys under test
+        keys = [
+            STATISTICS_CACHE_KEY, USER_STATISTICS_CACHE_KEY, LANGUAGE_LIST_CACHE_KEY, ROLE_LIST_CACHE_KEY,
+            MEDICAL_RECORD_TYPE_LIST_CACHE_KEY,
+            user_email_key(self.user.email), user_email_key('renamed@example.com'),
+        ]
+        tiered_delete_many(keys)
+        self.addCleanup(tiered_delete_many, keys)
+
+    def by_email(self, email):
+        return self.client.get('/api/users/by_email/', {'email': email})
+
+    def test_user_lookup_follows_email_change(self):
+        self.assertEqual(self.by_email('patient@example.com').status_code, 200)
+
+        self.user.email = 'renamed@example.com'
+        self.user.save()
+
+        self.assertEqual(self.by_email('patient@example.com').status_code, 404)
+        response = self.by_email('renamed@example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.user.id)
+
+    def test_user_lookup_follows_role_edit(self):
+        self.assertEqual(self.by_email(self.user.email).json()['role']['display_name'], 'Patient')
+
+        self.role.display_name = 'Patient (renamed)'
+        self.role.save()
+
+        self.assertEqual(self.by_email(self.user.email).json()['role']['display_name'], 'Patient (renamed)')
+
+    def test_lookup_is_served_from_local_cache(self):
+        self.assertEqual(self.by_email(self.user.email).status_code, 200)
+        # Gone from Redis, still in this process's L1
+        cache.delete(user_email_key(self.user.email))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.by_email(self.user.email).json()['id'], self.user.id)
+
+    def test_cached_lookup_is_the_rendered_response(self):
+        response = self.by_email(self.user.email)
+        self.assertEqual(cache.get(user_email_key(self.user.email)), response.content)
+        self.assertEqual(self.by_email(self.user.email).content, response.content)
+
+    def test_matching_etag_gets_not_modified(self):
+        response = self.by_email(self.user.email)
+        etag = response.headers['ETag']
+
+        response = self.client.get('/api/users/by_email/', {'email': self.user.email}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # A changed payload gets a new tag and a full response
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        response = self.client.get('/api/users/by_email/', {'email': self.user.email}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_user_statistics_follow_activation_changes(self):
+        def inactive_users():
+            return self.client.get('/api/users/statistics/').json()['inactive_users']
+
+        self.assertEqual(inactive_users(), 0)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(inactive_users(), 1)
+
+    def test_language_list_follows_writes(self):
+        def codes():
+            return {language['code'] for language in self.client.get('/api/languages/').json()}
+
+        Language.objects.create(code='en', name='English', native_name='English')
+        self.assertEqual(codes(), {'en'})
+        Language.objects.create(code='fr', name='French', native_name='Français')
+        self.assertEqual(codes(), {'en', 'fr'})
+        Language.objects.get(code='en').delete()
+        self.assertEqual(codes(), {'fr'})
+
+    def test_invalidation_is_repeated_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Language.objects.create(code='en', name='English', native_name='English')
+            # A concurrent read re-caches the list before the write commits
+            tiered_set(LANGUAGE_LIST_CACHE_KEY, b'[]', 60, 60)
+        self.assertIsNone(tiered_get(LANGUAGE_LIST_CACHE_KEY, 60))
+
+    def test_role_list_follows_writes(self):
+        def names():
+            return {role['name'] for role in self.client.get('/api/roles/').json()}
+
+        self.assertEqual(names(), {'PATIENT'})
+        Role.objects.create(name='CLINICIAN', display_name='Clinician')
+        self.assertEqual(names(), {'PATIENT', 'CLINICIAN'})
+
+    def test_medical_record_type_list_follows_writes(self):
+        def names():
+            return {row['type_name'] for row in self.client.get('/api/medical-record-types/').json()}
+
+        record_type = MedicalRecordType.objects.create(type_name='Biopsy')
+        self.assertIn('Biopsy', names())
+        record_type.is_active = False
+        record_type.save()
+        self.assertNotIn('Biopsy', names())
+
+    def test_statistics_follow_new_users_and_patients(self):
+        def statistics():
+            with run_refreshes_inline():
+                return self.client.get('/api/statistics/').json()
+
+        self.assertEqual(statistics()['total_users'], 1)
+
+        # The first read after a write is served the old figures while they
+        # are refreshed in the background
+        user = User.objects.create_user(
+            email='second@example.com', password='x', first_name='S', last_name='T', role=self.role
+        )
+        self.assertEqual(statistics()['total_users'], 1)
+        self.assertEqual(statistics()['total_users'], 2)
+
+        self.create_patient(user)
+        self.assertEqual(statistics()['total_patients'], 0)
+        self.assertEqual(statistics()['total_patients'], 1)
+
+class ChatSessionCacheTests(ServiceClientMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.patient = self.create_patient()
+        tiered_delete_many([chat_sessions_key(self.patient.pk)])
+        self.addCleanup(tiered_delete_many, [chat_sessions_key(self.patient.pk)])
+        self.session = ChatSession.objects.create(patient=self.patient, title='First')
+
+    def sessions(self):
+        response = self.client.get('/api/chat/sessions/', {'patient_id': self.patient.pk})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_sessions_nest_their_messages(self):
+        ChatMessage.objects.create(session=self.session, role='user', content='hello')
+
+        [session] = self.sessions()
+        self.assertEqual(session['title'], 'First')
+        self.assertEqual([message['content'] for message in session['messages']], ['hello'])
+
+    def test_cached_sessions_follow_message_and_session_writes(self):
+        self.assertEqual(self.sessions()[0]['messages'], [])
+        # Saved by session_id alone, as the chat service does
+        ChatMessage.objects.create(session_id=self.session.pk, role='user', content='hello')
+        self.assertEqual(len(self.sessions()[0]['messages']), 1)
+
+        ChatSession.objects.create(patient=self.patient, title='Second')
+        self.assertEqual(len(self.sessions()), 2)
+        self.session.delete()
+        self.assertEqual([session['title'] for session in self.sessions()], ['Second'])
+
+
+class EncryptionKeyCacheTests(ServiceClientMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        tiered_delete_many([encryption_key_key(self.user.id)])
+        self.addCleanup(tiered_delete_many, [encryption_key_key(self.user.id)])
+
+    def get_key(self):
+        response = self.client.get('/api/encryption-keys/get_or_create_key/', {'user_id': self.user.id})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_key_is_created_once_then_served_from_cache(self):
+        first = self.get_key()
+        self.assertTrue(first['created'])
+        with self.assertNumQueries(0):
+            second = self.get_key()
+        self.assertEqual((second['key'], second['created']), (first['key'], False))
+
+    def test_deleted_key_is_not_served_from_cache(self):
+        first = self.get_key()
+        UserEncryptionKey.objects.filter(user=self.user).get().delete()
+
+        second = self.get_key()
+        self.assertTrue(second['created'])
+        self.assertNotEqual(second['key'], first['key'])
+
+    def test_other_integrity_errors_are_not_a_missing_user(self):
+        with mock.patch.object(UserEncryptionKey.objects, 'get_or_create', side_effect=IntegrityError('violation')):
+            response = self.client.get('/api/encryption-keys/get_or_create_key/', {'user_id': self.user.id})
+        self.assertEqual(response.status_code, 409)
+
+
+class RefreshTokenCacheTests(ServiceClientMixin, TestCase):
+    def create_token(self, token):
+        tiered_delete_many([refresh_token_key(token)])
+        self.addCleanup(tiered_delete_many, [refresh_token_key(token)])
+        return RefreshToken.objects.create(user=self.user, token=token, expires_at=timezone.now() + timedelta(days=1))
+
+    def validate(self, token, **params):
+        return self.client.get('/api/refresh-tokens/validate_token/', {'token': token, **params})
+
+    def test_validation_is_served_from_cache(self):
+        self.create_token('test-token')
+        first = self.validate('test-token')
+        self.assertEqual(first.status_code, 200)
+
+        with self.assertNumQueries(0):
+            cached = self.validate('test-token')
+            self.assertEqual(self.validate('test-token', detail='false').json(), {'is_valid': True})
+        self.assertEqual(cached.json(), first.json())
+
+    def test_revoked_token_is_not_served_from_cache(self):
+        self.create_token('test-token')
+        self.validate('test-token')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/refresh-tokens/invalidate_token/', {'token': 'test-token'}, format='json')
+        self.assertEqual(self.validate('test-token').status_code, 404)
+
+    def test_validation_racing_a_revocation_is_not_served(self):
+        self.create_token('test-token')
+        read_at = timezone.now()
+        payload = self.validate('test-token').content
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/refresh-tokens/invalidate_token/', {'token': 'test-token'}, format='json')
+
+        # A validation that read the row before the revocation writes back late
+        tokens.cache_refresh_token('test-token', self.user.id, payload, read_at + timedelta(days=1), read_at)
+        self.assertEqual(self.validate('test-token').status_code, 404)
+
+    def test_revoking_twice_leaves_the_row_unwritten(self):
+        self.create_token('test-token')
+        url = '/api/refresh-tokens/invalidate_token/'
+        self.assertEqual(self.client.post(url, {'token': 'test-token'}, format='json').status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.post(url, {'token': 'test-token'}, format='json').status_code, 200)
+        # The UPDATE only matches live rows, so it writes none here
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"is_active"', updates[0].split('WHERE', 1)[1])
+        self.assertEqual(self.client.post(url, {'token': 'never-issued'}, format='json').status_code, 404)
+
+    # The covering constraint is only created where INCLUDE is supported
+    @skipUnlessDBFeature('supports_covering_indexes')
+    def test_token_digests_are_unique(self):
+        self.create_token('test-token')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.create_token('test-token')
+
+    def test_revoking_a_users_tokens_drops_their_entries(self):
+        for token in ('test-token-1', 'test-token-2'):
+            self.create_token(token)
+            self.validate(token)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/refresh-tokens/invalidate_user_tokens/', {'user_id': self.user.id}, format='json')
+        self.assertEqual(self.validate('test-token-1').status_code, 404)
+        self.assertEqual(self.validate('test-token-2').status_code, 404)
+
+    def test_detailed_validation_is_one_query(self):
+        refresh_token = self.create_token('test-token')
+        with self.assertNumQueries(1):
+            response = self.validate('test-token')
+        body = response.json()
+        self.assertEqual(
+            (body['id'], body['user_id'], body['user_email']), (refresh_token.id, self.user.id, self.user.email),
+        )
+
+    def test_lookup_goes_through_the_token_digest(self):
+        refresh_token = self.create_token('test-token')
+        self.assertEqual(bytes(refresh_token.token_hash), refresh_token_hash('test-token'))
+
+        # Only the digest is matched, not the stored plaintext
+        RefreshToken.objects.filter(pk=refresh_token.pk).update(token='unrelated')
+        self.assertEqual(self.validate('test-token', detail='false').status_code, 200)
+
+    def test_email_change_drops_cached_validations(self):
+        self.create_token('test-token')
+        self.validate('test-token')
+        tiered_delete_many([user_email_key('renamed@example.com')])
+
+        self.user.email = 'renamed@example.com'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.validate('test-token').json()['user_email'], 'renamed@example.com')
+
+    def test_revoking_a_users_tokens_is_one_write(self):
+        for token in ('test-token-1', 'test-token-2'):
+            self.create_token(token)
+            self.validate(token)
+
+        # The UPDATE alone: the tokens are not read back to find their keys
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(1):
+            self.client.post('/api/refresh-tokens/invalidate_user_tokens/', {'user_id': self.user.id}, format='json')
+        self.assertEqual(self.validate('test-token-1').status_code, 404)
+
+
+class RefreshTokenFilterTests(ServiceClientMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        keys = {
+            'TOKEN_FILTER_KEY': 'test_refresh_token_filter',
+            'TOKEN_FILTER_NEXT_KEY': 'test_refresh_token_filter:next',
+            'TOKEN_FILTER_BUILD_KEY': 'test_refresh_token_filter:build',
+            'TOKEN_FILTER_STALE_KEY': 'test_refresh_token_filter:stale',
+        }
+        for name, key in keys.items():
+            patcher = mock.patch.object(tokens, name, key)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.redis = get_redis_connection('default')
+        self.redis.delete(*keys.values())
+        self.addCleanup(self.redis.delete, *keys.values())
+
+    def create_token(self, token):
+        with self.captureOnCommitCallbacks(execute=True):
+            return RefreshToken.objects.create(
+                user=self.user, token=token, expires_at=timezone.now() + timedelta(days=1),
+            )
+
+    def validate(self, token):
+        return self.client.get('/api/refresh-tokens/validate_token/', {'token': token, 'detail': 'false'})
+
+    def test_unbuilt_filter_defers_to_the_database(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.validate('never-issued').status_code, 404)
+
+    def test_built_filter_turns_away_unknown_tokens(self):
+        self.create_token('test-token')
+        self.assertEqual(tokens.rebuild_token_filter(), 1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.validate('never-issued').status_code, 404)
+        self.assertEqual(self.validate('test-token').status_code, 200)
+
+    def test_tokens_created_after_a_rebuild_are_added(self):
+        tokens.rebuild_token_filter()
+        self.create_token('test-token')
+        self.assertEqual(self.validate('test-token').status_code, 200)
+
+    def test_failed_add_falls_back_to_the_database(self):
+        tokens.rebuild_token_filter()
+        with mock.patch('redis.client.Pipeline.execute', side_effect=RedisError('redis down')):
+            self.create_token('test-token')
+        self.assertEqual(self.validate('test-token').status_code, 200)
+
+        tokens.rebuild_token_filter()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.validate('never-issued').status_code, 404)
+
+
+class GetOrComputeTests(TestCase):
+    key = 'test:get_or_compute'
+
+    def setUp(self):
+        keys = [self.key, f'{self.key}:lock', f'{self.key}:stale']
+        cache.delete_many(keys)
+        self.addCleanup(cache.delete_many, keys)
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_is_computed_once_then_cached(self):
+        self.assertEqual(get_or_compute(self.key, self.compute, 60), 1)
+        self.assertEqual(get_or_compute(self.key, self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_lock_holder_leaves_others_the_stale_copy(self):
+        get_or_compute(self.key, self.compute, 60)
+        cache.delete(self.key)
+        # Another worker is recomputing
+        cache.add(f'{self.key}:lock', 1, 10)
+
+        self.assertEqual(get_or_compute(self.key, self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_cold_cache_computes_without_the_lock(self):
+        cache.add(f'{self.key}:lock', 1, 10)
+        self.assertEqual(get_or_compute(self.key, self.compute, 60), 1)
+
+    def test_background_refresh_serves_the_stale_copy(self):
+        get_or_compute(self.key, self.compute, 60, refresh_in_background=True)
+        cache.delete(self.key)
+
+        with run_refreshes_inline():
+            self.assertEqual(get_or_compute(self.key, self.compute, 60, refresh_in_background=True), 1)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(get_or_compute(self.key, self.compute, 60, refresh_in_background=True), 2)
+        self.assertIsNone(cache.get(f'{self.key}:lock'))
+
+    def test_database_error_serves_the_stale_copy(self):
+        get_or_compute(self.key, self.compute, 60)
+        cache.delete(self.key)
+
+        with self.assertLogs('data_management.caching', 'WARNING'):
+            value = get_or_compute(self.key, mock.Mock(side_effect=OperationalError), 60)
+        self.assertEqual(value, 1)
+
+    def test_database_error_without_stale_copy_is_raised(self):
+        with self.assertRaises(OperationalError):
+            get_or_compute(self.key, mock.Mock(side_effect=OperationalError), 60)
+
+
+class CancerTypeTreeTests(ServiceClientMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = CancerType.objects.create(cancer_type='Breast')
+        self.child = CancerType.objects.create(cancer_type='Ductal', parent=self.root)
+
+    def tree(self, pk):
+        response = self.client.get(f'/api/cancer-types/{pk}/tree/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_tree_nests_the_whole_subtree(self):
+        CancerType.objects.create(cancer_type='Invasive', parent=self.child)
+
+        tree = self.tree(self.root.pk)
+        self.assertEqual(tree['cancer_type'], 'Breast')
+        self.assertIsNone(tree['parent_details'])
+        [child] = tree['subtypes']
+        self.assertEqual(child['parent_details'], {'id': self.root.pk, 'cancer_type': 'Breast'})
+        self.assertEqual([node['cancer_type'] for node in child['subtypes']], ['Invasive'])
+
+    def test_subtree_root_reports_its_parent(self):
+        self.assertEqual(self.tree(self.child.pk)['parent_details'], {'id': self.root.pk, 'cancer_type': 'Breast'})
+
+    def test_cached_tree_follows_descendant_writes(self):
+        self.assertEqual(self.tree(self.root.pk)['subtypes'][0]['subtypes'], [])
+        CancerType.objects.create(cancer_type='Invasive', parent=self.child)
+        self.assertEqual(len(self.tree(self.root.pk)['subtypes'][0]['subtypes']), 1)
+
+    def test_unknown_cancer_type_is_404(self):
+        self.assertEqual(self.client.get('/api/cancer-types/999999/tree/').status_code, 404)
+
+    def test_subtypes_nest_grandchildren(self):
+        CancerType.objects.create(cancer_type='Invasive', parent=self.child)
+
+        [child] = self.client.get(f'/api/cancer-types/{self.root.pk}/subtypes/').json()
+        self.assertEqual(child['cancer_type'], 'Ductal')
+        self.assertEqual([node['cancer_type'] for node in child['subtypes']], ['Invasive'])
+
+    def test_top_level_lists_only_roots(self):
+        CancerType.objects.create(cancer_type='Lung')
+
+        roots = self.client.get('/api/cancer-types/top_level/').json()
+        self.assertEqual([node['cancer_type'] for node in roots], ['Breast', 'Lung'])
+        self.assertEqual(roots[0]['subtypes'][0]['cancer_type'], 'Ductal')
+
+
+class WriteBehindQueueTests(ServiceClientMixin, TestCase):
+    queue = 'test_event_log_queue'
+    access_queue = 'test_access_log_queue'
+
+    def setUp(self):
+        super().setUp()
+        # Queues of their own, so nothing queued by a running service is taken
+        for patcher in (
+            mock.patch.object(write_behind, 'EVENT_LOG_QUEUE', self.queue),
+            mock.patch.object(write_behind, 'ACCESS_LOG_QUEUE', self.access_queue),
+            mock.patch.object(write_behind, 'LAST_ACCESSED_SET', 'test_file_last_accessed'),
+            mock.patch.dict(write_behind.QUEUE_MODELS, {self.queue: EventLog, self.access_queue: FileAccessLog}),
+            mock.patch.dict(
+                write_behind.QUEUE_TIMESTAMP_FIELDS, {self.queue: 'created_at', self.access_queue: 'accessed_at'}
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.redis = get_redis_connection('default')
+        self.processing = write_behind.processing_list(self.queue)
+        keys = [
+            self.queue, self.processing, self.access_queue, write_behind.processing_list(self.access_queue),
+            'test_file_last_accessed',
+        ]
+        self.redis.delete(*keys)
+        self.addCleanup(self.redis.delete, *keys)
+
+    def event(self, event_type='login', **data):
+        return {'event_type': event_type, 'service': 'auth-service', 'data': data}
+
+    def test_log_event_is_queued(self):
+        response = self.client.post('/api/events/', self.event(), format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'status': 'queued'})
+        self.assertEqual(self.redis.llen(self.queue), 1)
+        self.assertFalse(EventLog.objects.exists())
+
+    def test_log_event_is_written_directly_without_redis(self):
+        with mock.patch.object(write_behind, 'get_redis_connection', side_effect=ConnectionError), \
+                self.assertLogs('data_management.write_behind', 'WARNING'):
+            response = self.client.post('/api/events/', self.event(), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(EventLog.objects.count(), 1)
+
+    def test_drain_inserts_queued_events(self):
+        before = timezone.now()
+        for i in range(3):
+            self.assertTrue(write_behind.enqueue_event(self.event(n=i)))
+
+        self.assertEqual(write_behind.drain(self.queue), 3)
+        rows = list(EventLog.objects.order_by('id'))
+        self.assertEqual([row.data['n'] for row in rows], [0, 1, 2])
+        # Rows keep the time they were queued, not the time they were drained
+        self.assertTrue(all(before <= row.created_at <= timezone.now() for row in rows))
+        self.assertEqual(self.redis.llen(self.queue), 0)
+        self.assertEqual(self.redis.llen(self.processing), 0)
+        self.assertEqual(write_behind.drain(self.queue), 0)
+
+    def test_drain_inserts_queued_file_accesses(self):
+        file = self.create_file()
+        write_behind.log_file_access(file_id=file.id, user_id=self.user.id, access_type='download', success=True)
+        queued_at = json.loads(self.redis.lindex(self.access_queue, 0))['accessed_at']
+        self.assertFalse(FileAccessLog.objects.exists())
+
+        self.assertEqual(write_behind.drain(self.access_queue), 1)
+        log = FileAccessLog.objects.get()
+        self.assertEqual((log.file_id, log.access_type), (file.id, 'download'))
+        self.assertEqual(log.accessed_at.isoformat(), queued_at)
+
+    def test_flush_writes_the_latest_access_per_file(self):
+        file = self.create_file()
+        latest = timezone.now()
+        self.assertTrue(write_behind.touch_file(file.pk, latest))
+        # Reported out of order; the newer time wins
+        write_behind.touch_file(file.pk, latest - timedelta(minutes=5))
+
+        self.assertEqual(write_behind.flush_last_accessed(), 1)
+        file.refresh_from_db()
+        # Scores are float seconds, so allow for rounding below a millisecond
+        self.assertAlmostEqual(file.last_accessed, latest, delta=timedelta(milliseconds=1))
+        self.assertEqual(write_behind.flush_last_accessed(), 0)
+
+    def test_failed_flush_keeps_the_access_times(self):
+        file = self.create_file()
+        write_behind.touch_file(file.pk, timezone.now())
+        with mock.patch.object(FileMetadata.objects, 'bulk_update', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                write_behind.flush_last_accessed()
+
+        self.assertEqual(write_behind.flush_last_accessed(), 1)
+
+    def test_leftover_batch_is_drained_first(self):
+        # A batch claimed by a worker that died before acknowledging it
+        write_behind.enqueue_event(self.event('first'))
+        self.redis.lmove(self.queue, self.processing, 'LEFT', 'RIGHT')
+        write_behind.enqueue_event(self.event('second'))
+
+        self.assertEqual(write_behind.drain(self.queue), 1)
+        self.assertEqual(list(EventLog.objects.values_list('event_type', flat=True)), ['first'])
+        self.assertEqual(write_behind.drain(self.queue), 1)
+        self.assertEqual(EventLog.objects.count(), 2)
+
+    def test_failed_insert_keeps_the_batch(self):
+        write_behind.enqueue_event(self.event())
+        with mock.patch.object(EventLog.objects, 'bulk_create', side_effect=OperationalError), \
+                mock.patch.object(EventLog.objects, 'create', side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                write_behind.drain(self.queue)
+        self.assertEqual(self.redis.llen(self.processing), 1)
+
+        self.assertEqual(write_behind.drain(self.queue), 1)
+        self.assertEqual(EventLog.objects.count(), 1)
+
+
+class DerivedPrefetchTests(ServiceClientMixin, TestCase):
+    def add_clinicians(self, count):
+        specialization = CancerType.objects.get_or_create(cancer_type='Breast')[0]
+        for _ in range(count):
+            n = Clinician.objects.count()
+            user = User.objects.create_user(
+                email=f'clinician{n}@example.com', password='x', first_name='C', last_name=str(n), role=self.role
+            )
+            Clinician.objects.create(user=user, specialization=specialization)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(context)
+
+    def test_clinician_list_queries_do_not_grow_with_rows(self):
+        self.add_clinicians(1)
+        baseline = self.count_queries('/api/clinicians/')
+        self.add_clinicians(3)
+        self.assertEqual(self.count_queries('/api/clinicians/'), baseline)
+
+    def test_cancer_type_subtypes_are_prefetched(self):
+        for name in ('Breast', 'Lung'):
+            root = CancerType.objects.create(cancer_type=name)
+            CancerType.objects.create(cancer_type=f'{name} A', parent=root)
+        baseline = self.count_queries('/api/cancer-types/top_level/')
+        root = CancerType.objects.create(cancer_type='Skin')
+        CancerType.objects.create(cancer_type='Skin A', parent=root)
+        self.assertEqual(self.count_queries('/api/cancer-types/top_level/'), baseline)
+
+    def test_patient_assignment_queries_do_not_grow_with_rows(self):
+        self.add_clinicians(1)
+        clinician = Clinician.objects.get()
+        subtype = CancerType.objects.create(cancer_type='Breast A', parent=clinician.specialization)
+
+        def assign():
+            n = Patient.objects.count()
+            user = User.objects.create_user(
+                email=f'patient{n}@example.com', password='x', first_name='P', last_name=str(n), role=self.role
+            )
+            return PatientAssignment.objects.create(
+                patient=self.create_patient(user), cancer_subtype=subtype, assigned_clinician=clinician,
+                updated_by=self.user,
+            )
+
+        assignment = assign()
+        baseline = self.count_queries('/api/patient-assignments/')
+        assign()
+        assign()
+        self.assertEqual(self.count_queries('/api/patient-assignments/'), baseline)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/patient-assignments/by_patient/', {'patient_id': assignment.patient_id})
+        self.assertEqual(response.json()['cancer_subtype_detail']['parent'], 'Breast')
+
+    def test_patient_list_queries_do_not_grow_with_rows(self):
+        def add_patient():
+            n = Patient.objects.count()
+            user = User.objects.create_user(
+                email=f'patient{n}@example.com', password='x', first_name='P', last_name=str(n), role=self.role
+            )
+            self.create_patient(user)
+
+        add_patient()
+        baseline = self.count_queries('/api/patients/')
+        for _ in range(3):
+            add_patient()
+        self.assertEqual(self.count_queries('/api/patients/'), baseline)
+
+    def test_patient_assignment_renders_without_unread_columns(self):
+        self.add_clinicians(1)
+        clinician = Clinician.objects.get()
+        subtype = CancerType.objects.create(cancer_type='Breast A', parent=clinician.specialization)
+        patient = self.create_patient()
+        PatientAssignment.objects.create(patient=patient, cancer_subtype=subtype, assigned_clinician=clinician)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/api/patients/{patient.pk}/')
+        self.assertEqual(len(context), 1)
+        # Only the names of the subtype and its parent are rendered
+        self.assertNotIn('"description"', context.captured_queries[0]['sql'])
+        assignment = response.json()['assignment']
+        self.assertEqual(
+            (assignment['cancer_subtype_name'], assignment['cancer_type_name'], assignment['assigned_clinician']),
+            ('Breast A', 'Breast', clinician.id),
+        )
+
+    def test_rag_document_retrieve_joins_file_and_cancer_type(self):
+        document = self.create_document()
+        self.assertEqual(self.count_queries(f'/api/rag-documents/{document.pk}/'), 1)
+
+
+class InvalidationBroadcastTests(TestCase):
+    key = 'test:broadcast'
+
+    def test_other_workers_invalidations_reach_local_cache(self):
+        # Reading through L1 starts this process's listener
+        tiered_get(self.key, 60)
+        caches['local'].set(self.key, b'stale', 60)
+        self.addCleanup(caches['local'].delete, self.key)
+
+        # Another worker handled the write
+        deadline = time.monotonic() + 5
+        while caches['local'].get(self.key) is not None and time.monotonic() < deadline:
+            get_redis_connection('default').publish(INVALIDATION_CHANNEL, json.dumps([self.key]))
+            time.sleep(0.05)
+        self.assertIsNone(caches['local'].get(self.key))
+
+
+class CachingPaginatorTests(ServiceClientMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Start from a fresh version so counts cached by other runs are not read
+        bump_count_version(RAGDocument)
+        self.create_document('first')
+
+    def list_documents(self, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/rag-documents/', params)
+        self.assertEqual(response.status_code, 200)
+        counted = any('COUNT(' in query['sql'].upper() for query in context.captured_queries)
+        return response.json()['count'], counted
+
+    def test_count_is_cached_between_pages(self):
+        self.assertEqual(self.list_documents(), (1, True))
+        self.assertEqual(self.list_documents(), (1, False))
+
+    def test_cached_count_is_one_cache_read(self):
+        self.list_documents()
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            self.assertEqual(self.list_documents(), (1, False))
+        # The version and the count come back together
+        (keys,), _ = get_many.call_args
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(len(keys), 2)
+        self.assertTrue(all(key.startswith('pgcount') for key in keys))
+
+    def test_document_writes_refresh_the_count(self):
+        self.list_documents()
+        self.create_document('second')
+        self.assertEqual(self.list_documents(), (2, True))
+
+    def test_embedding_writes_refresh_the_filtered_count(self):
+        self.assertEqual(self.list_documents(has_embeddings='true'), (0, True))
+        RAGEmbedding.objects.create(
+            document=RAGDocument.objects.get(), chunk_index=0, chunk_text='t', embedding=[0.1]
+        )
+        self.assertEqual(self.list_documents(has_embeddings='true'), (1, True))
+        self.assertEqual(self.list_documents(has_embeddings='false'), (0, True))
+
+
+class RAGDocumentKeysetTests(ServiceClientMixin, TestCase):
+    def test_cursor_pages_walk_every_document_once(self):
+        documents = [self.create_document(f'doc{i}') for i in range(5)]
+        # Three uploads in the same instant exercise the tie-breaker
+        FileMetadata.objects.filter(pk__in=[doc.file_id for doc in documents[:3]]).update(uploaded_at=timezone.now())
+
+        rows = self.walk_cursor_pages('/api/rag-documents/', {'page_size': 2})
+        expected = RAGDocument.objects.order_by('-file__uploaded_at', '-file').values_list('file', flat=True)
+        self.assertEqual([row['file'] for row in rows], [str(file_id) for file_id in expected])
+
+
+class RAGDocumentStreamTests(ServiceClientMixin, TestCase):
+    def stream(self, **params):
+        response = self.client.get('/api/rag-documents/stream/', params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_stream_exports_every_matching_document(self):
+        documents = [self.create_document(f'doc{i}') for i in range(3)]
+        RAGEmbedding.objects.create(document=documents[1], chunk_index=0, chunk_text='t', embedding=[0.1])
+
+        self.assertEqual(len(self.stream()), 3)
+        self.assertEqual([row['file'] for row in self.stream(has_embeddings='true')], [str(documents[1].pk)])
+
+
+class UserFilesTests(ServiceClientMixin, TestCase):
+    def user_files(self, **params):
+        response = self.client.get('/api/files/user_files/', {'user_id': str(self.user.id), **params})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_streams_live_files_newest_first(self):
+        old = self.create_file('old')
+        new = self.create_file('new')
+        self.create_file('gone', is_deleted=True)
+        FileMetadata.objects.filter(pk=old.pk).update(uploaded_at=timezone.now() - timedelta(days=1))
+
+        rows = self.user_files()
+        self.assertEqual([row['id'] for row in rows], [str(new.id), str(old.id)])
+        self.assertEqual(set(rows[0]), {'id', 'filename', 'file_size', 'mime_type', 'uploaded_at', 'last_accessed'})
+
+    def test_user_without_files_gets_an_empty_list(self):
+        self.assertEqual(self.user_files(), [])
+
+    def test_failing_query_is_a_500_not_a_truncated_stream(self):
+        self.create_file('scan')
+        with mock.patch('django.db.models.query.QuerySet.iterator', side_effect=OperationalError('down')):
+            response = self.client.get('/api/files/user_files/', {'user_id': str(self.user.id)})
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {'error': 'down'})
+
+    def test_cursor_pages_walk_every_live_file_once(self):
+        files = [self.create_file(f'file{i}') for i in range(5)]
+        self.create_file('gone', is_deleted=True)
+        # Three uploads in the same instant exercise the tie-breaker
+        FileMetadata.objects.filter(pk__in=[file.pk for file in files[:3]]).update(uploaded_at=timezone.now())
+
+        rows = self.walk_cursor_pages('/api/files/user_files/', {'user_id': str(self.user.id), 'page_size': 2})
+        expected = FileMetadata.objects.filter(is_deleted=False).order_by('-uploaded_at', '-id')
+        self.assertEqual([row['id'] for row in rows], [str(file.pk) for file in expected])
+
+
+class FileMetadataCreateTests(ServiceClientMixin, TestCase):
+    def create_metadata(self, file_hash, **fields):
+        return self.client.post('/api/files/create_metadata/', {
+            'user_id': str(self.user.id), 'filename': 'scan.pdf', 'file_hash': file_hash,
+            'file_size': 1, 'mime_type': 'application/pdf', 'storage_path': 'scan.pdf', **fields,
+        }, format='json')
+
+    def test_second_upload_of_live_content_conflicts(self):
+        self.assertEqual(self.create_metadata('a' * 64).status_code, 201)
+        self.assertEqual(self.create_metadata('a' * 64).status_code, 409)
+        self.assertEqual(FileMetadata.objects.filter(file_hash='a' * 64).count(), 1)
+
+    def test_deleted_copy_does_not_block_upload(self):
+        self.create_file('scan', file_hash='a' * 64, is_deleted=True)
+        self.assertEqual(self.create_metadata('a' * 64).status_code, 201)
+
+    def test_other_integrity_errors_are_not_a_missing_user(self):
+        response = self.create_metadata('a' * 64, filename=None)
+        self.assertEqual(response.status_code, 400)
+        self.assertNotEqual(response.json()['error'], 'User not found')
+
+    def test_only_one_live_file_per_hash(self):
+        self.create_file('first', file_hash='a' * 64)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.create_file('second', file_hash='a' * 64)
+
+
+class HealthCheckTests(ServiceClientMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        caches['local'].delete(HEALTH_CHECK_PROBE_KEY)
+        self.addCleanup(caches['local'].delete, HEALTH_CHECK_PROBE_KEY)
+
+    def test_good_probe_is_reused(self):
+        with mock.patch.object(connection, 'ensure_connection', wraps=connection.ensure_connection) as probe:
+            for _ in range(3):
+                self.assertEqual(self.client.get('/api/health/').status_code, 200)
+        self.assertEqual(probe.call_count, 1)
+
+    def test_failed_probe_is_not_reused(self):
+        with mock.patch.object(connection, 'ensure_connection', side_effect=OperationalError('down')):
+            self.assertEqual(self.client.get('/api/health/').status_code, 503)
+        response = self.client.get('/api/health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['database'], 'connected')
+
+    def test_public_probe_body(self):
+        response = self.client.get('/health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'status': 'healthy', 'service': 'database-service', 'database': 'connected', 'cache': 'connected',
+        })
+
+    def test_both_endpoints_share_one_probe(self):
+        with mock.patch.object(connection, 'ensure_connection', wraps=connection.ensure_connection) as probe:
+            self.assertEqual(self.client.get('/health/').status_code, 200)
+            self.assertEqual(self.client.get('/api/health/').status_code, 200)
+        self.assertEqual(probe.call_count, 1)
+
+    def test_public_probe_reports_a_failure_as_500(self):
+        with mock.patch.object(connection, 'ensure_connection', side_effect=OperationalError('down')):
+            self.assertEqual(self.client.get('/health/').status_code, 500)
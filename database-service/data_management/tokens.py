@@ -0,0 +1,193 @@
+"""
+Refresh token helpers shared by the API views and maintenance commands.
+
+A Bloom filter of issued tokens is kept as a Redis bitmap so
+``validate_token`` can turn away tokens that were never issued without a
+database query. Tokens are added as they are created and the filter is
+rebuilt from the live tokens by the ``cleanup_expired_tokens`` worker,
+which also drops revoked and expired ones from it. Until the first build,
+whenever Redis is unavailable, or after an add has failed, every token is
+treated as possibly valid. Tokens only reach the filter through
+``RefreshToken.save()``; rows written by ``bulk_create`` or raw SQL are
+picked up by the next rebuild.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from .caching import refresh_token_epoch_key, refresh_token_key, refresh_token_revoked_key
+from .models import RefreshToken, refresh_token_hash
+
+logger = logging.getLogger(__name__)
+
+EXPIRED_TOKEN_DELETE_BATCH_SIZE = 1000
+
+TOKEN_FILTER_KEY = 'refresh_token_filter'
+# Tokens created while a rebuild runs are added here too and merged in
+TOKEN_FILTER_NEXT_KEY = 'refresh_token_filter:next'
+TOKEN_FILTER_BUILD_KEY = 'refresh_token_filter:build'
+# Set when an add fails; the filter is ignored until the next rebuild
+TOKEN_FILTER_STALE_KEY = 'refresh_token_filter:stale'
+# ~1% false positives at TOKEN_FILTER_BITS / 9.6 live tokens
+TOKEN_FILTER_HASHES = 7
+
+
+def delete_expired_refresh_tokens(batch_size=EXPIRED_TOKEN_DELETE_BATCH_SIZE, cutoff=None):
+    """
+    Delete tokens that expired before ``cutoff`` (default: now) in batches
+    of ``batch_size``.
+
+    Each batch is one ``DELETE ... WHERE id IN (SELECT id ... LIMIT n)``
+    committed on its own, so a large backlog never holds row locks or
+    builds one huge transaction. The cutoff is fixed once up front so every
+    batch agrees on what counts as expired and the loop always terminates.
+    Returns the number of tokens deleted.
+    """
+    if cutoff is None:
+        cutoff = timezone.now()
+    total = 0
+    while True:
+        batch = RefreshToken.objects.filter(expires_at__lt=cutoff).values('pk')[:batch_size]
+        deleted, _ = RefreshToken.objects.filter(pk__in=batch).delete()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def cache_refresh_token(token, user_id, payload, expires_at, now):
+    """
+    Cache the rendered ``validate_token`` response for ``token`` until it
+    expires, capped at ``REFRESH_TOKEN_CACHE_TTL``. ``now`` is when the row
+    was read, which the revocation markers are compared against.
+    """
+    ttl = int(min((expires_at - now).total_seconds(), settings.REFRESH_TOKEN_CACHE_TTL))
+    if ttl > 0:
+        cache.set(refresh_token_key(token), (now.timestamp(), user_id, payload), ttl)
+
+
+def cached_refresh_token(token):
+    """
+    Return the cached validation for ``token`` unless the token, or all of
+    its user's tokens, were revoked after the row was read.
+    """
+    key, revoked_key = refresh_token_key(token), refresh_token_revoked_key(token)
+    values = cache.get_many([key, revoked_key])
+    entry = values.get(key)
+    if entry is None:
+        return None
+    read_at, user_id, payload = entry
+    revoked_at = values.get(revoked_key)
+    if revoked_at is not None and read_at < revoked_at:
+        return None
+    epoch = cache.get(refresh_token_epoch_key(user_id))
+    if epoch is not None and read_at < epoch:
+        return None
+    return payload
+
+
+def revoke_cached_refresh_token(token):
+    """
+    Disown the cached validation of ``token``. Call it once the database
+    change has committed: a validation that read the old row then is older
+    than the marker, even if it writes its entry back after the delete.
+    """
+    # Outlives any entry it needs to disown
+    cache.set(refresh_token_revoked_key(token), time.time(), settings.REFRESH_TOKEN_CACHE_TTL * 2)
+    cache.delete(refresh_token_key(token))
+
+
+def revoke_cached_refresh_tokens(user_id):
+    """
+    Disown every cached validation of ``user_id``'s tokens read before now
+    with one write, however many tokens the user has. Call it once the
+    database change has committed, so a validation that read the old row
+    is always older than the epoch.
+    """
+    # Outlives any entry it needs to disown
+    cache.set(refresh_token_epoch_key(user_id), time.time(), settings.REFRESH_TOKEN_CACHE_TTL * 2)
+
+
+def _filter_offsets(digest):
+    # Double hashing over the token's SHA-256 digest
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:16], 'big') | 1
+    return [(h1 + i * h2) % settings.TOKEN_FILTER_BITS for i in range(TOKEN_FILTER_HASHES)]
+
+
+def add_to_token_filter(tokens):
+    try:
+        pipe = get_redis_connection('default').pipeline(transaction=False)
+        for token in tokens:
+            for offset in _filter_offsets(refresh_token_hash(token)):
+                pipe.setbit(TOKEN_FILTER_KEY, offset, 1)
+                pipe.setbit(TOKEN_FILTER_NEXT_KEY, offset, 1)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Refresh token filter not updated: {e}")
+        # A filter missing a live token would turn it away, so stop trusting
+        # it; a flag rather than a delete also outlasts a concurrent swap
+        try:
+            get_redis_connection('default').set(TOKEN_FILTER_STALE_KEY, 1)
+        except Exception as e:
+            logger.error(f"Refresh token filter could not be marked stale: {e}")
+
+
+def token_may_be_valid(token):
+    """
+    False only if ``token`` was definitely never issued (or has been
+    dropped by a rebuild); a True still needs the database to confirm.
+    """
+    try:
+        pipe = get_redis_connection('default').pipeline(transaction=False)
+        pipe.getbit(TOKEN_FILTER_KEY, settings.TOKEN_FILTER_BITS)
+        pipe.exists(TOKEN_FILTER_STALE_KEY)
+        for offset in _filter_offsets(refresh_token_hash(token)):
+            pipe.getbit(TOKEN_FILTER_KEY, offset)
+        built, stale, *bits = pipe.execute()
+    except Exception as e:
+        logger.debug(f"Refresh token filter unavailable: {e}")
+        return True
+    return not built or bool(stale) or all(bits)
+
+
+def rebuild_token_filter():
+    """
+    Replace the filter with one holding only the live tokens; returns how
+    many were added.
+
+    The bitmap is built in memory and swapped in atomically. Tokens created
+    after the read set their bits in TOKEN_FILTER_NEXT_KEY, which was
+    cleared beforehand and is merged into the new bitmap before the swap.
+    The stale flag is cleared at the same point: the read below sees every
+    token whose add failed before it, and a later failure sets it again.
+    """
+    redis = get_redis_connection('default')
+    redis.delete(TOKEN_FILTER_NEXT_KEY, TOKEN_FILTER_STALE_KEY)
+    # One bit past the hashed range marks the filter as built, so bits set
+    # by add_to_token_filter alone never count as a complete filter
+    bitmap = bytearray(settings.TOKEN_FILTER_BITS // 8 + 1)
+    marker = settings.TOKEN_FILTER_BITS
+    bitmap[marker >> 3] |= 0x80 >> (marker & 7)
+    count = 0
+    # The stored digests are all the filter needs: 32 bytes a row, streamed
+    # through a server-side cursor, with nothing to rehash
+    digests = RefreshToken.objects.filter(
+        is_active=True, expires_at__gt=timezone.now()
+    ).values_list('token_hash', flat=True)
+    for digest in digests.iterator(chunk_size=2000):
+        # Redis numbers bits from the most significant bit of each byte
+        for offset in _filter_offsets(bytes(digest)):
+            bitmap[offset >> 3] |= 0x80 >> (offset & 7)
+        count += 1
+
+    pipe = redis.pipeline(transaction=True)
+    pipe.set(TOKEN_FILTER_BUILD_KEY, bytes(bitmap))
+    pipe.bitop('OR', TOKEN_FILTER_NEXT_KEY, TOKEN_FILTER_NEXT_KEY, TOKEN_FILTER_BUILD_KEY)
+    pipe.rename(TOKEN_FILTER_NEXT_KEY, TOKEN_FILTER_KEY)
+    pipe.delete(TOKEN_FILTER_BUILD_KEY)
+    pipe.execute()
+    return count
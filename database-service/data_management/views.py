@@ -1,16 +1,37 @@
-from rest_framework import viewsets, status, filters, permissions
+from rest_framework import viewsets, status, filters, permissions, serializers
 from rest_framework.exceptions import NotFound, PermissionDenied
 from rest_framework.decorators import action, api_view
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from django.core.cache import cache
 from django.conf import settings
-from django.db.models import Q
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q
+from django.db.models.expressions import RawSQL
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+import itertools
 from datetime import datetime, timedelta
+from cryptography.fernet import Fernet
+from .caching import (
+    LANGUAGE_LIST_CACHE_KEY, MEDICAL_RECORD_TYPE_LIST_CACHE_KEY, ROLE_LIST_CACHE_KEY, STATISTICS_CACHE_KEY,
+    USER_STATISTICS_CACHE_KEY, cancer_type_tree_key, chat_sessions_key, encryption_key_key, get_or_compute,
+    healthy_body, json_response, probe_backends, render_json, streaming_json_response, tiered_get, tiered_set,
+    unhealthy_response, user_email_key,
+)
+from .pagination import (
+    CachingOptionalCursorPagination, KeysetPagination, OptionalCursorPagination, bump_count_version,
+)
+from .prefetch import AutoPrefetchViewSetMixin
+from .tokens import (
+    cache_refresh_token, cached_refresh_token, delete_expired_refresh_tokens, revoke_cached_refresh_token,
+    revoke_cached_refresh_tokens, token_may_be_valid,
+)
+from .write_behind import enqueue_event, log_file_access, touch_file
 from .models import User, Role, Patient, Clinician, EventLog, CancerType, UserEncryptionKey, FileMetadata, FileAccessLog, RAGDocument, RefreshToken, Language, RAGEmbedding, RAGEmbeddingJob, PatientAssignment, MedicalRecordType, MedicalRecord, MedicalRecordAccess, ChatMessage, ChatSession
-from .models import SuggestionTemplate, SuggestedHistory
+from .models import SuggestionTemplate, SuggestedHistory, refresh_token_hash
 from .serializers import (
     UserSerializer, PatientSerializer, ClinicianSerializer,
     EventLogSerializer, CancerTypeSerializer,
@@ -18,9 +39,16 @@ from .serializers import (
     RAGEmbeddingSerializer, RAGEmbeddingJobSerializer, EmbeddingCreateSerializer,
     BulkEmbeddingCreateSerializer, EmbeddingSearchSerializer, PatientAssignmentSerializer,
     MedicalRecordTypeSerializer, MedicalRecordSerializer, MedicalRecordAccessSerializer,
-    ChatMessageSerializer, ChatSessionSerializer, SuggestionTemplateSerializer, SuggestedHistorySerializer
+    ChatMessageSerializer, ChatSessionSerializer, SuggestedHistorySerializer
 )
 
+TRUTHY_PARAMS = frozenset(('true', '1', 'yes', 't', 'on'))
+
+
+def is_truthy(value):
+    """Interpret a boolean query parameter"""
+    return value.lower() in TRUTHY_PARAMS
+
 
 class LanguageViewSet(viewsets.ModelViewSet):
     queryset = Language.objects.filter(is_active=True)
@@ -28,15 +56,13 @@ class LanguageViewSet(viewsets.ModelViewSet):
     
     def list(self, request):
         """List all active languages"""
-        languages = self.get_queryset().order_by('display_order', 'name')
-        data = [{
-            'code': lang.code,
-            'name': lang.name,
-            'native_name': lang.native_name,
-            'is_active': lang.is_active,
-            'display_order': lang.display_order
-        } for lang in languages]
-        return Response(data)
+        def load():
+            return render_json(list(self.get_queryset().order_by('display_order', 'name').values(
+                'code', 'name', 'native_name', 'is_active', 'display_order'
+            )))
+        
+        payload = get_or_compute(LANGUAGE_LIST_CACHE_KEY, load, 3600, local_timeout=settings.LOCAL_CACHE_TTL)
+        return json_response(payload, request=request)
     
     def retrieve(self, request, pk=None):
         """Get single language by code"""
@@ -59,15 +85,12 @@ class RoleViewSet(viewsets.ModelViewSet):
     
     def list(self, request):
         """List all roles"""
-        roles = self.get_queryset()
-        data = [{
-            'id': role.id,
-            'name': role.name,
-            'display_name': role.display_name,
-            'description': role.description,
-            'created_at': role.created_at.isoformat() if role.created_at else None
-        } for role in roles]
-        return Response(data)
+        def load():
+            # The renderer formats created_at itself
+            return render_json(list(self.get_queryset().values('id', 'name', 'display_name', 'description', 'created_at')))
+        
+        payload = get_or_compute(ROLE_LIST_CACHE_KEY, load, 3600, local_timeout=settings.LOCAL_CACHE_TTL)
+        return json_response(payload, request=request)
     
     def retrieve(self, request, pk=None):
         """Get single role"""
@@ -78,13 +101,13 @@ class RoleViewSet(viewsets.ModelViewSet):
                 'name': role.name,
                 'display_name': role.display_name,
                 'description': role.description,
-                'created_at': role.created_at.isoformat() if role.created_at else None
+                'created_at': role.created_at
             })
         except Role.DoesNotExist:
             return Response({'error': 'Role not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(AutoPrefetchViewSetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     
@@ -93,39 +116,35 @@ class UserViewSet(viewsets.ModelViewSet):
         role = self.request.query_params.get('role')
         is_active = self.request.query_params.get('is_active')
         
+        # Collect the filters so the queryset is cloned once
+        filters = {}
         if role:
-            queryset = queryset.filter(role__name=role)
+            filters['role__name'] = role
         
         if is_active is not None:
-            queryset = queryset.filter(is_active=is_active.lower() == 'true')
+            filters['is_active'] = is_truthy(is_active)
             
-        return queryset.select_related('role')
+        return queryset.filter(**filters)
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Get user statistics for admin dashboard"""
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        # Get counts by role
-        total_users = User.objects.count()
-        active_patients = User.objects.filter(role__name='PATIENT', is_active=True).count()
-        active_clinicians = User.objects.filter(role__name='CLINICIAN', is_active=True).count()
-        total_admins = User.objects.filter(role__name='ADMIN').count()
-        inactive_users = User.objects.filter(is_active=False).count()
-        
-        # Get new users in last 7 days
-        week_ago = timezone.now() - timedelta(days=7)
-        new_users_week = User.objects.filter(date_joined__gte=week_ago).count()
+        def compute():
+            week_ago = timezone.now() - timedelta(days=7)
+            
+            # Single pass over users with one filtered COUNT per statistic
+            return render_json(User.objects.aggregate(
+                total_users=Count('id'),
+                active_patients=Count('id', filter=Q(role__name='PATIENT', is_active=True)),
+                active_clinicians=Count('id', filter=Q(role__name='CLINICIAN', is_active=True)),
+                total_admins=Count('id', filter=Q(role__name='ADMIN')),
+                inactive_users=Count('id', filter=Q(is_active=False)),
+                new_users_week=Count('id', filter=Q(date_joined__gte=week_ago)),
+            ))
         
-        return Response({
-            'total_users': total_users,
-            'active_patients': active_patients,
-            'active_clinicians': active_clinicians,
-            'total_admins': total_admins,
-            'inactive_users': inactive_users,
-            'new_users_week': new_users_week
-        })
+        # new_users_week drifts with time, so this is only cached briefly
+        payload = get_or_compute(USER_STATISTICS_CACHE_KEY, compute, 60)
+        return json_response(payload, request=request)
     
     @action(detail=False, methods=['get'])
     def by_email(self, request):
@@ -134,37 +153,48 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Email parameter required'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Check cache first
-        cache_key = f"user_email_{email}"
-        cached_user = cache.get(cache_key)
-        if cached_user:
-            return Response(cached_user)
+        cache_key = user_email_key(email)
+        cached_user = tiered_get(cache_key, settings.LOCAL_CACHE_TTL)
+        if cached_user is not None:
+            return json_response(cached_user, request=request)
         
         try:
-            user = User.objects.select_related('role').get(email=email)
+            user = User.objects.values(
+                'id', 'email', 'password', 'first_name', 'last_name', 'is_active', 'date_joined', 'last_login',
+                'role__id', 'role__name', 'role__display_name', 'role__description',
+            ).get(email=email)
             data = {
-                'id': user.id,
-                'email': user.email,
-                'password': user.password,  # Include password for service-to-service auth
-                'first_name': user.first_name,
-                'last_name': user.last_name,
+                'id': user['id'],
+                'email': user['email'],
+                'password': user['password'],  # Include password for service-to-service auth
+                'first_name': user['first_name'],
+                'last_name': user['last_name'],
                 'role': {
-                    'id': user.role.id,
-                    'name': user.role.name,
-                    'display_name': user.role.display_name,
-                    'description': user.role.description
+                    'id': user['role__id'],
+                    'name': user['role__name'],
+                    'display_name': user['role__display_name'],
+                    'description': user['role__description']
                 },
-                'is_active': user.is_active,
-                'date_joined': user.date_joined,
-                'last_login': user.last_login
+                'is_active': user['is_active'],
+                'date_joined': user['date_joined'],
+                'last_login': user['last_login']
             }
-            cache.set(cache_key, data, settings.CACHE_TTL)
-            return Response(data)
+            payload = render_json(data)
+            tiered_set(cache_key, payload, settings.USER_EMAIL_CACHE_TTL, settings.LOCAL_CACHE_TTL)
+            return json_response(payload, request=request)
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
-class PatientViewSet(viewsets.ModelViewSet):
-    queryset = Patient.objects.all()
+class PatientViewSet(AutoPrefetchViewSetMixin, viewsets.ModelViewSet):
+    # The assignment only renders the subtype's and parent's names
+    queryset = Patient.objects.defer(
+        'assignment__cancer_subtype__description', 'assignment__cancer_subtype__created_at',
+        'assignment__cancer_subtype__updated_at', 'assignment__cancer_subtype__parent__description',
+        'assignment__cancer_subtype__parent__created_at', 'assignment__cancer_subtype__parent__updated_at',
+    )
     serializer_class = PatientSerializer
+    # assignment (the subtype and its parent) is a SerializerMethodField
+    extra_select_related = ('assignment__cancer_subtype__parent',)
     
     @action(detail=False, methods=['get'])
     def by_user(self, request):
@@ -173,12 +203,28 @@ class PatientViewSet(viewsets.ModelViewSet):
             return Response({'error': 'user_id parameter required'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            patient = Patient.objects.get(user_id=user_id)
+            patient = self.get_queryset().get(user_id=user_id)
             serializer = self.get_serializer(patient)
             return Response(serializer.data)
         except Patient.DoesNotExist:
             return Response({'error': 'Patient not found'}, status=status.HTTP_404_NOT_FOUND)
     
+    @action(detail=False, methods=['post'])
+    def by_users(self, request):
+        """Get the patients for a list of user IDs in one query"""
+        user_ids = request.data.get('user_ids')
+        if not isinstance(user_ids, list):
+            return Response({'error': 'user_ids list required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            user_ids = [int(user_id) for user_id in user_ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'user_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        patients = self.get_queryset().filter(user_id__in=user_ids).order_by('user_id')
+        serializer = self.get_serializer(patients, many=True)
+        return Response(serializer.data)
+    
     @action(detail=False, methods=['get'])
     def by_clinician(self, request):
         """Get all patients assigned to a specific clinician"""
@@ -188,29 +234,31 @@ class PatientViewSet(viewsets.ModelViewSet):
         
         try:
             # Get patients through PatientAssignment
-            patients = Patient.objects.filter(
+            patients = list(self.get_queryset().filter(
                 assignment__assigned_clinician_id=clinician_id
-            ).select_related('preferred_language', 'assignment', 'assignment__cancer_subtype')
+            ))
+            
+            # Patient.user_id is not a foreign key, so fetch all users in one query
+            users = User.objects.select_related('role').defer('password').in_bulk(
+                [patient.user_id for patient in patients]
+            )
             
-            # Get user data for each patient
             patient_data = []
             for patient in patients:
                 patient_dict = self.get_serializer(patient).data
-                # Fetch user data separately
-                try:
-                    user = User.objects.get(id=patient.user_id)
-                    patient_dict['user'] = UserSerializer(user).data
-                except User.DoesNotExist:
-                    patient_dict['user'] = None
+                user = users.get(patient.user_id)
+                patient_dict['user'] = UserSerializer(user).data if user else None
                 patient_data.append(patient_dict)
             
             return Response(patient_data)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class ClinicianViewSet(viewsets.ModelViewSet):
-    queryset = Clinician.objects.select_related('user', 'specialization').all()
+class ClinicianViewSet(AutoPrefetchViewSetMixin, viewsets.ModelViewSet):
+    queryset = Clinician.objects.defer('user__password')
     serializer_class = ClinicianSerializer
+    # specialization_detail is a SerializerMethodField
+    extra_select_related = ('specialization',)
     
     def create(self, request, *args, **kwargs):
         """Create a new clinician profile"""
@@ -225,21 +273,26 @@ class ClinicianViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            # Get user
-            user = User.objects.get(id=user_id)
-            
-            # Get specialization if provided
-            specialization = None
-            if specialization_id:
-                specialization = CancerType.objects.get(id=specialization_id, parent__isnull=True)
-            
-            # Create clinician
-            clinician = Clinician.objects.create(
-                user=user,
-                specialization=specialization,
-                phone_number=phone_number,
-                is_available=True
-            )
+            with transaction.atomic():
+                # Get user (with the role the response needs) and validate the
+                # specialization in the same query
+                users = User.objects.select_related('role').defer('password')
+                if specialization_id:
+                    specialization_id = int(specialization_id)
+                    users = users.annotate(specialization_exists=Exists(
+                        CancerType.objects.filter(id=specialization_id, parent__isnull=True)
+                    ))
+                user = users.get(id=user_id)
+                if specialization_id and not user.specialization_exists:
+                    raise CancerType.DoesNotExist
+                
+                # Create clinician
+                clinician = Clinician.objects.create(
+                    user=user,
+                    specialization_id=specialization_id or None,
+                    phone_number=phone_number,
+                    is_available=True
+                )
             
             serializer = self.get_serializer(clinician)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -258,7 +311,8 @@ class ClinicianViewSet(viewsets.ModelViewSet):
             return Response({'error': 'user_id parameter required'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            clinician = Clinician.objects.select_related('user', 'specialization').get(user__id=user_id)
+            # Same joins as the list (user, the user's role and specialization)
+            clinician = self.get_queryset().get(user__id=user_id)
             serializer = self.get_serializer(clinician)
             return Response(serializer.data)
         except Clinician.DoesNotExist:
@@ -266,7 +320,7 @@ class ClinicianViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def available(self, request):
-        clinicians = self.queryset.filter(is_available=True)
+        clinicians = self.get_queryset().filter(is_available=True)
         serializer = self.get_serializer(clinicians, many=True)
         return Response(serializer.data)
     
@@ -276,7 +330,7 @@ class ClinicianViewSet(viewsets.ModelViewSet):
         if not specialization_id:
             return Response({'error': 'specialization_id parameter required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        clinicians = self.queryset.filter(specialization__id=specialization_id)
+        clinicians = self.get_queryset().filter(specialization__id=specialization_id)
         serializer = self.get_serializer(clinicians, many=True)
         return Response(serializer.data)
 
@@ -284,30 +338,47 @@ class ClinicianViewSet(viewsets.ModelViewSet):
 def log_event(request):
     serializer = EventLogSerializer(data=request.data)
     if serializer.is_valid():
+        # Event logs are written behind by the process_log_queues worker.
+        # Callers ignore the body, so a queued event answers 202 without
+        # the row, which does not exist yet
+        if enqueue_event(serializer.validated_data):
+            return Response({'status': 'queued'}, status=status.HTTP_202_ACCEPTED)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['GET'])
-def statistics(request):
-    # Cache statistics for better performance
-    cache_key = "database_statistics"
-    cached_stats = cache.get(cache_key)
-    if cached_stats:
-        return Response(cached_stats)
-    
-    stats = {
-        'total_users': User.objects.count(),
+def compute_statistics():
+    user_stats = User.objects.aggregate(
+        total_users=Count('id'),
+        total_clinicians=Count('id', filter=Q(role__name='CLINICIAN')),
+    )
+    return {
+        'total_users': user_stats['total_users'],
         'total_patients': Patient.objects.count(),
-        'total_clinicians': User.objects.filter(role__name='CLINICIAN').count(),
+        'total_clinicians': user_stats['total_clinicians'],
     }
-    
-    cache.set(cache_key, stats, 3600)  # Cache for 1 hour
-    return Response(stats)
 
-class CancerTypeViewSet(viewsets.ModelViewSet):
-    queryset = CancerType.objects.all()
+@api_view(['GET'])
+def statistics(request):
+    # Cache statistics for five minutes (writes also invalidate them);
+    # once warm, misses are answered from the stale copy while one worker
+    # reruns the aggregates in the background
+    payload = get_or_compute(
+        STATISTICS_CACHE_KEY, lambda: render_json(compute_statistics()), 300,
+        local_timeout=settings.LOCAL_STATISTICS_CACHE_TTL, refresh_in_background=True,
+    )
+    return json_response(payload, request=request)
+
+class CancerTypeViewSet(AutoPrefetchViewSetMixin, viewsets.ModelViewSet):
+    # parent_details only renders the parent's id and name
+    queryset = CancerType.objects.defer('parent__description', 'parent__created_at', 'parent__updated_at')
     serializer_class = CancerTypeSerializer
+    # parent_details and the recursive subtypes are SerializerMethodFields
+    extra_select_related = ('parent',)
+    extra_prefetch_related = (
+        Prefetch('subtypes', queryset=CancerType.objects.order_by('cancer_type')),
+        Prefetch('subtypes__subtypes', queryset=CancerType.objects.order_by('cancer_type')),
+    )
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -332,17 +403,102 @@ class CancerTypeViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def top_level(self, request):
         """Get only top-level cancer types (no parent)"""
-        cancer_types = self.queryset.filter(parent__isnull=True).order_by('cancer_type')
-        serializer = self.get_serializer(cancer_types, many=True)
-        return Response(serializer.data)
+        cache_key = cancer_type_tree_key('top_level')
+        payload = cache.get(cache_key)
+        if payload is None:
+            # The whole forest is one scan of the table, nested in Python
+            nodes = cancer_type_nodes(CancerType.objects.all())
+            payload = render_json([node for node in nodes.values() if node['parent'] is None])
+            cache.set(cache_key, payload, settings.CACHE_TTL)
+        return json_response(payload, request=request)
     
     @action(detail=True, methods=['get'])
     def subtypes(self, request, pk=None):
         """Get all subtypes of a specific cancer type"""
-        cancer_type = self.get_object()
-        subtypes = cancer_type.subtypes.all().order_by('cancer_type')
-        serializer = self.get_serializer(subtypes, many=True)
-        return Response(serializer.data)
+        pk = self._tree_pk(pk)
+        cache_key = cancer_type_tree_key(f'{pk}_subtypes')
+        payload = cache.get(cache_key)
+        if payload is None:
+            nodes = cancer_type_nodes(cancer_type_subtree(pk))
+            if pk not in nodes:
+                raise NotFound('Cancer type not found')
+            payload = render_json(nodes[pk]['subtypes'])
+            cache.set(cache_key, payload, settings.CACHE_TTL)
+        return json_response(payload, request=request)
+    
+    @action(detail=True, methods=['get'])
+    def tree(self, request, pk=None):
+        """Get a cancer type with its full subtree, loaded in one recursive query"""
+        pk = self._tree_pk(pk)
+        cache_key = cancer_type_tree_key(pk)
+        cached_tree = cache.get(cache_key)
+        if cached_tree is not None:
+            return json_response(cached_tree, request=request)
+        
+        nodes = cancer_type_nodes(cancer_type_subtree(pk))
+        if pk not in nodes:
+            raise NotFound('Cancer type not found')
+        root = nodes[pk]
+        if root['parent'] is not None:
+            parent = CancerType.objects.values('id', 'cancer_type').get(id=root['parent'])
+            root['parent_details'] = parent
+        
+        payload = render_json(root)
+        cache.set(cache_key, payload, settings.CACHE_TTL)
+        return json_response(payload, request=request)
+    
+    @staticmethod
+    def _tree_pk(pk):
+        try:
+            return int(pk)
+        except (TypeError, ValueError):
+            raise NotFound('Cancer type not found')
+
+
+def cancer_type_subtree(pk):
+    """Cancer type ``pk`` and all of its descendants, selected by one recursive query"""
+    return CancerType.objects.filter(id__in=RawSQL(
+        """
+        WITH RECURSIVE subtree AS (
+            SELECT id FROM cancer_types WHERE id = %s
+            UNION ALL
+            SELECT c.id FROM cancer_types c JOIN subtree s ON c.parent_id = s.id
+        )
+        SELECT id FROM subtree
+        """,
+        [pk]
+    ))
+
+
+def cancer_type_nodes(queryset):
+    """
+    Render cancer type rows in CancerTypeSerializer's shape, keyed by id and
+    ordered by name, with each row nested under its parent when the parent
+    is among the rows.
+    """
+    date_field = serializers.DateTimeField()
+    rows = list(queryset.order_by('cancer_type').values(
+        'id', 'cancer_type', 'description', 'parent_id', 'created_at', 'updated_at'
+    ))
+    nodes = {
+        row['id']: {
+            'id': row['id'],
+            'cancer_type': row['cancer_type'],
+            'description': row['description'],
+            'parent': row['parent_id'],
+            'parent_details': None,
+            'subtypes': [],
+            'created_at': date_field.to_representation(row['created_at']),
+            'updated_at': date_field.to_representation(row['updated_at']),
+        }
+        for row in rows
+    }
+    for node in nodes.values():
+        parent = nodes.get(node['parent'])
+        if parent is not None:
+            node['parent_details'] = {'id': parent['id'], 'cancer_type': parent['cancer_type']}
+            parent['subtypes'].append(node)
+    return nodes
 
 
 class UserEncryptionKeyViewSet(viewsets.ModelViewSet):
@@ -357,30 +513,63 @@ class UserEncryptionKeyViewSet(viewsets.ModelViewSet):
             return Response({'error': 'user_id is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            user = User.objects.get(id=user_id)
-            key, created = UserEncryptionKey.objects.get_or_create(user=user)
+            user_id = int(user_id)
+            # Keys almost never change, so steady-state lookups skip the database
+            cache_key = encryption_key_key(user_id)
+            cached_key = tiered_get(cache_key, settings.LOCAL_CACHE_TTL)
+            if cached_key is not None:
+                return json_response(cached_key, request=request)
             
-            # Generate a new key if it doesn't exist
-            if created or not key.key:
-                from cryptography.fernet import Fernet
-                key.key = Fernet.generate_key().decode()
-                key.save()
+            with transaction.atomic():
+                # New keys are generated in the insert itself; the user is
+                # validated by the foreign key rather than a separate lookup
+                key, created = UserEncryptionKey.objects.get_or_create(
+                    user_id=user_id,
+                    defaults={'key': Fernet.generate_key().decode()}
+                )
+                
+                # Repair rows left without a key
+                if not key.key:
+                    key.key = Fernet.generate_key().decode()
+                    key.rotated_at = timezone.now()
+                    UserEncryptionKey.objects.filter(pk=key.pk).update(key=key.key, rotated_at=key.rotated_at)
             
-            return Response({
-                'user_id': user.id,
+            data = {
+                'user_id': user_id,
                 'key': key.key,
-                'created': created,
+                'created': False,
                 'rotated_at': key.rotated_at
-            })
-        except User.DoesNotExist:
-            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+            }
+            tiered_set(cache_key, render_json(data), settings.ENCRYPTION_KEY_CACHE_TTL, settings.LOCAL_CACHE_TTL)
+            
+            data['created'] = created
+            return Response(data)
+        except IntegrityError as e:
+            # Only the failure path pays for telling a missing user apart
+            if not User.objects.filter(pk=user_id).exists():
+                return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+USER_FILE_COLUMNS = ('id', 'filename', 'file_size', 'mime_type', 'uploaded_at', 'last_accessed')
+_user_file_fields = FileMetadataSerializer().fields
+
+
+def user_file_row(row):
+    """Format a user_files values() row the way FileMetadataSerializer would."""
+    return {
+        name: None if row[name] is None else _user_file_fields[name].to_representation(row[name])
+        for name in USER_FILE_COLUMNS
+    }
+
+
 class FileMetadataViewSet(viewsets.ModelViewSet):
     queryset = FileMetadata.objects.all()
     serializer_class = FileMetadataSerializer
+    # user_files ?cursor= pages walk user_files_active_idx newest first
+    cursor_ordering = ('-uploaded_at', '-id')
     
     @action(detail=False, methods=['post'])
     def check_duplicate(self, request):
@@ -403,32 +592,36 @@ class FileMetadataViewSet(viewsets.ModelViewSet):
             if not user_id:
                 return Response({'error': 'user_id is required'}, status=status.HTTP_400_BAD_REQUEST)
             
-            user = User.objects.get(id=user_id)
-            
-            # Check for duplicate
-            file_hash = request.data.get('file_hash')
-            if FileMetadata.objects.filter(file_hash=file_hash, is_deleted=False).exists():
-                return Response({'error': 'File already exists'}, status=status.HTTP_409_CONFLICT)
-            
-            metadata = FileMetadata.objects.create(
-                user=user,
-                filename=request.data.get('filename'),
-                file_hash=file_hash,
-                file_size=request.data.get('file_size'),
-                mime_type=request.data.get('mime_type'),
-                storage_path=request.data.get('storage_path'),
-                is_encrypted=request.data.get('is_encrypted', True)
-            )
-            
-            # Log the upload
-            FileAccessLog.objects.create(
-                file=metadata,
-                user=user,
-                access_type='upload',
-                ip_address=request.data.get('ip_address'),
-                user_agent=request.data.get('user_agent'),
-                success=True
-            )
+            with transaction.atomic():
+                # Duplicate check and insert in one step; the user is validated
+                # by the foreign key rather than a separate lookup. A concurrent
+                # upload of the same content trips file_hash_active_uniq, which
+                # get_or_create resolves to the existing row (409)
+                metadata, created = FileMetadata.objects.get_or_create(
+                    file_hash=request.data.get('file_hash'),
+                    is_deleted=False,
+                    defaults={
+                        'user_id': user_id,
+                        'filename': request.data.get('filename'),
+                        'file_size': request.data.get('file_size'),
+                        'mime_type': request.data.get('mime_type'),
+                        'storage_path': request.data.get('storage_path'),
+                        'is_encrypted': request.data.get('is_encrypted', True),
+                    }
+                )
+                if not created:
+                    return Response({'error': 'File already exists'}, status=status.HTTP_409_CONFLICT)
+                
+                # Log the upload once the file row is committed
+                upload_log = {
+                    'file_id': metadata.id,
+                    'user_id': user_id,
+                    'access_type': 'upload',
+                    'ip_address': request.data.get('ip_address'),
+                    'user_agent': request.data.get('user_agent'),
+                    'success': True,
+                }
+                transaction.on_commit(lambda: log_file_access(**upload_log))
             
             return Response({
                 'id': str(metadata.id),
@@ -436,8 +629,13 @@ class FileMetadataViewSet(viewsets.ModelViewSet):
                 'uploaded_at': metadata.uploaded_at
             }, status=status.HTTP_201_CREATED)
             
-        except User.DoesNotExist:
-            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+        except IntegrityError as e:
+            # Only the failure path pays for telling the violations apart
+            if not User.objects.filter(pk=user_id).exists():
+                return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+            if FileMetadata.objects.filter(file_hash=request.data.get('file_hash'), is_deleted=False).exists():
+                return Response({'error': 'File already exists'}, status=status.HTTP_409_CONFLICT)
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
@@ -448,37 +646,46 @@ class FileMetadataViewSet(viewsets.ModelViewSet):
         if not user_id:
             return Response({'error': 'user_id is required'}, status=status.HTTP_400_BAD_REQUEST)
         
+        files = FileMetadata.objects.filter(
+            user_id=user_id,
+            is_deleted=False
+        ).order_by('-uploaded_at').values(*USER_FILE_COLUMNS)
+        
         try:
-            files = FileMetadata.objects.filter(
-                user_id=user_id,
-                is_deleted=False
-            ).order_by('-uploaded_at')
-            
-            files_data = [{
-                'id': str(file.id),
-                'filename': file.filename,
-                'file_size': file.file_size,
-                'mime_type': file.mime_type,
-                'uploaded_at': file.uploaded_at,
-                'last_accessed': file.last_accessed
-            } for file in files]
+            # ?cursor= (empty for the first page) returns one keyset page, so
+            # a client showing the latest files reads only those rows
+            if KeysetPagination.cursor_query_param in request.query_params:
+                paginator = KeysetPagination()
+                page = paginator.paginate_queryset(files, request, view=self)
+                return paginator.get_paginated_response([user_file_row(row) for row in page])
             
-            return Response(files_data)
+            # Rows are read through a server-side cursor in chunks and written
+            # out as they arrive, so memory stays flat however many files the
+            # user has. The first chunk is fetched here, so a failing query
+            # still gets a 500 rather than a truncated 200
+            rows = files.iterator(chunk_size=500)
+            first = next(rows, None)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        rows = itertools.chain([first], rows) if first is not None else ()
+        return streaming_json_response(map(user_file_row, rows))
     
     @action(detail=True, methods=['post'])
     def mark_deleted(self, request, pk=None):
         """Mark a file as deleted"""
         try:
-            file = self.get_object()
-            file.is_deleted = True
-            file.deleted_at = timezone.now()
-            file.save()
+            # Single UPDATE of the two changed columns, without loading the row
+            updated = FileMetadata.objects.filter(pk=pk).update(
+                is_deleted=True,
+                deleted_at=timezone.now()
+            )
+            if not updated:
+                return Response({'error': 'File not found'}, status=status.HTTP_404_NOT_FOUND)
             
             # Log the deletion
-            FileAccessLog.objects.create(
-                file=file,
+            log_file_access(
+                file_id=pk,
                 user_id=request.data.get('user_id'),
                 access_type='delete',
                 ip_address=request.data.get('ip_address'),
@@ -494,15 +701,19 @@ class FileMetadataViewSet(viewsets.ModelViewSet):
     def log_access(self, request, pk=None):
         """Log file access"""
         try:
-            file = self.get_object()
+            if not FileMetadata.objects.filter(pk=pk).exists():
+                return Response({'error': 'File not found'}, status=status.HTTP_404_NOT_FOUND)
             
-            # Update last accessed time
-            file.last_accessed = timezone.now()
-            file.save()
+            # Update last accessed time. It is buffered for the log queue
+            # worker, which writes it back batched, so a download costs an
+            # index probe here rather than a row write
+            now = timezone.now()
+            if not touch_file(pk, now):
+                FileMetadata.objects.filter(pk=pk).update(last_accessed=now)
             
             # Create access log
-            FileAccessLog.objects.create(
-                file=file,
+            log_file_access(
+                file_id=pk,
                 user_id=request.data.get('user_id'),
                 access_type=request.data.get('access_type', 'download'),
                 ip_address=request.data.get('ip_address'),
@@ -516,13 +727,16 @@ class FileMetadataViewSet(viewsets.ModelViewSet):
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class RAGDocumentViewSet(viewsets.ModelViewSet):
-    queryset = RAGDocument.objects.select_related('file', 'cancer_type').all()
+class RAGDocumentViewSet(AutoPrefetchViewSetMixin, viewsets.ModelViewSet):
+    queryset = RAGDocument.objects.all()
     serializer_class = RAGDocumentSerializer
-    pagination_class = PageNumberPagination
+    # ?cursor= pages by upload date without COUNT or OFFSET; page/count
+    # requests from the admin UI keep working
+    pagination_class = CachingOptionalCursorPagination
+    cursor_ordering = ('-file__uploaded_at', '-file')
     
-    def list(self, request, *args, **kwargs):
-        """List RAG documents with pagination"""
+    def document_rows(self, request):
+        """Filtered documents as plain rows ordered by upload date"""
         queryset = self.filter_queryset(self.get_queryset())
         
         # Apply filtering if needed
@@ -530,42 +744,53 @@ class RAGDocumentViewSet(viewsets.ModelViewSet):
         if cancer_type_id:
             queryset = queryset.filter(cancer_type_id=cancer_type_id)
         
-        # Order by upload date
-        queryset = queryset.order_by('-file__uploaded_at')
+        # ?has_embeddings=false lists documents still waiting to be embedded.
+        # A correlated EXISTS probes the (document, chunk_index) index per
+        # document instead of joining every chunk row
+        has_embeddings = request.query_params.get('has_embeddings')
+        if has_embeddings is not None:
+            embedded = Exists(RAGEmbedding.objects.filter(document=OuterRef('pk')))
+            queryset = queryset.filter(embedded if is_truthy(has_embeddings) else ~embedded)
+        
+        # Order by upload date and read the joined columns as plain rows
+        return queryset.order_by(*self.cursor_ordering).values(
+            'file', 'cancer_type', 'cancer_type__cancer_type',
+            'file__filename', 'file__file_size', 'file__uploaded_at', 'file__mime_type',
+        )
+    
+    @staticmethod
+    def to_dict(row):
+        # Use custom format for backwards compatibility
+        return {
+            'file': row['file'],
+            'cancer_type_id': row['cancer_type'],
+            'cancer_type': row['cancer_type__cancer_type'],
+            'file_data': {
+                'filename': row['file__filename'],
+                'file_size': row['file__file_size'],
+                'uploaded_at': row['file__uploaded_at'],
+                'mime_type': row['file__mime_type'],
+            }
+        }
+    
+    def list(self, request, *args, **kwargs):
+        """List RAG documents with pagination"""
+        queryset = self.document_rows(request)
         
         page = self.paginate_queryset(queryset)
         if page is not None:
-            # Use custom format for backwards compatibility
-            data = []
-            for rag_doc in page:
-                data.append({
-                    'file': str(rag_doc.file.id),
-                    'cancer_type_id': rag_doc.cancer_type.id,
-                    'cancer_type': rag_doc.cancer_type.cancer_type,
-                    'file_data': {
-                        'filename': rag_doc.file.filename,
-                        'file_size': rag_doc.file.file_size,
-                        'uploaded_at': rag_doc.file.uploaded_at.isoformat() if rag_doc.file.uploaded_at else None,
-                        'mime_type': rag_doc.file.mime_type,
-                    }
-                })
-            return self.get_paginated_response(data)
+            return self.get_paginated_response([self.to_dict(row) for row in page])
         
         # If pagination is not configured
-        data = []
-        for rag_doc in queryset:
-            data.append({
-                'file': str(rag_doc.file.id),
-                'cancer_type_id': rag_doc.cancer_type.id,
-                'cancer_type': rag_doc.cancer_type.cancer_type,
-                'file_data': {
-                    'filename': rag_doc.file.filename,
-                    'file_size': rag_doc.file.file_size,
-                    'uploaded_at': rag_doc.file.uploaded_at.isoformat() if rag_doc.file.uploaded_at else None,
-                    'mime_type': rag_doc.file.mime_type,
-                }
-            })
-        return Response(data)
+        return Response([self.to_dict(row) for row in queryset])
+    
+    @action(detail=False, methods=['get'])
+    def stream(self, request):
+        """All matching RAG documents as one unpaginated JSON array"""
+        # Rows are read through a server-side cursor and rendered one at a
+        # time, so memory stays flat however large the corpus is
+        rows = self.document_rows(request).iterator(chunk_size=500)
+        return streaming_json_response(map(self.to_dict, rows))
     
     def create(self, request, *args, **kwargs):
         """Create RAG document association"""
@@ -577,16 +802,23 @@ class RAGDocumentViewSet(viewsets.ModelViewSet):
         
         try:
             # Check if file exists
-            file_metadata = FileMetadata.objects.get(id=file_id)
+            file_metadata = FileMetadata.objects.only('id', 'filename').get(id=file_id)
             
             # Check if cancer type exists
-            cancer_type = CancerType.objects.get(id=cancer_type_id)
+            cancer_type = CancerType.objects.only('id', 'cancer_type').get(id=cancer_type_id)
             
-            # Create RAG document
-            rag_doc = RAGDocument.objects.create(
+            # Create RAG document; get_or_create falls back to a lookup if a
+            # concurrent request inserts the same file first, so a duplicate is
+            # reported as a conflict rather than surfacing the key violation
+            rag_doc, created = RAGDocument.objects.get_or_create(
                 file=file_metadata,
-                cancer_type=cancer_type
+                defaults={'cancer_type': cancer_type}
             )
+            if not created:
+                return Response(
+                    {'error': 'RAG document already exists for this file'},
+                    status=status.HTTP_409_CONFLICT
+                )
             
             return Response({
                 'file_id': str(rag_doc.file.id),
@@ -601,39 +833,25 @@ class RAGDocumentViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Cancer type not found'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def destroy(self, request, *args, **kwargs):
+        """Delete a RAG document together with its embeddings and jobs"""
+        # Only the key is needed to delete; the default lookup joins the file
+        # and cancer type. The cascade to embeddings and jobs runs as one
+        # DELETE per table inside the same transaction as the document's.
+        document = get_object_or_404(RAGDocument.objects.only('pk'), pk=kwargs['pk'])
+        self.perform_destroy(document)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 @api_view(['GET'])
 def health_check(request):
     """Health check endpoint - requires authentication"""
     try:
-        # Check database connection
-        from django.db import connection
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-        
-        # Check cache connection
-        cache_status = 'connected'
-        try:
-            cache.set('health_check', 'ok', 10)
-            cache.get('health_check')
-        except:
-            cache_status = 'disconnected'
-        
-        return Response({
-            'status': 'healthy',
-            'service': 'database-service',
-            'database': 'connected',
-            'cache': cache_status,
-            'authenticated': True,
-            'auth_type': getattr(request, 'auth', 'unknown')
-        })
+        cache_status = probe_backends()
+        return json_response(healthy_body(cache_status, getattr(request, 'auth', 'unknown')))
     except Exception as e:
-        return Response({
-            'status': 'unhealthy',
-            'service': 'database-service',
-            'error': str(e)
-        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return unhealthy_response(e, status.HTTP_503_SERVICE_UNAVAILABLE)
 
 
 class RefreshTokenViewSet(viewsets.ModelViewSet):
@@ -653,9 +871,13 @@ class RefreshTokenViewSet(viewsets.ModelViewSet):
         try:
             user = User.objects.get(id=user_id)
             
-            # Convert expires_at string to datetime
-            from dateutil import parser
-            expires_at_dt = parser.parse(expires_at)
+            # Convert expires_at string to datetime. Callers send ISO 8601,
+            # which the stdlib parses directly; dateutil only handles the rest
+            try:
+                expires_at_dt = datetime.fromisoformat(expires_at)
+            except ValueError:
+                from dateutil import parser
+                expires_at_dt = parser.parse(expires_at)
             
             refresh_token = RefreshToken.objects.create(
                 user=user,
@@ -679,26 +901,55 @@ class RefreshTokenViewSet(viewsets.ModelViewSet):
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     @action(detail=False, methods=['get'])
+    @method_decorator(cache_control(no_store=True))
     def validate_token(self, request):
         """Validate a refresh token"""
         token = request.query_params.get('token')
         if not token:
             return Response({'error': 'token parameter required'}, status=status.HTTP_400_BAD_REQUEST)
         
+        detail = is_truthy(request.query_params.get('detail', 'true'))
+        # Only live tokens are cached, never past their expiry, and revoking
+        # a token (or all of a user's) disowns its entry
+        payload = cached_refresh_token(token)
+        if payload is not None:
+            return json_response(payload) if detail else Response({'is_valid': True})
+        # Tokens that were never issued are turned away without a query
+        if not token_may_be_valid(token):
+            return Response({'is_valid': False}, status=status.HTTP_404_NOT_FOUND)
+        
+        now = timezone.now()
+        # ?detail=false: callers that only need a yes/no get an EXISTS probe
+        # with no join and no row to hydrate
+        if not detail:
+            is_valid = RefreshToken.objects.filter(
+                token_hash=refresh_token_hash(token),
+                is_active=True,
+                expires_at__gt=now
+            ).exists()
+            return Response(
+                {'is_valid': is_valid},
+                status=status.HTTP_200_OK if is_valid else status.HTTP_404_NOT_FOUND
+            )
+        
         try:
-            refresh_token = RefreshToken.objects.select_related('user').get(
-                token=token,
+            # Only the columns the response reads, from both tables, as a
+            # plain row with no model instances to build
+            row = RefreshToken.objects.values('id', 'user_id', 'user__email', 'expires_at').get(
+                token_hash=refresh_token_hash(token),
                 is_active=True,
-                expires_at__gt=timezone.now()
+                expires_at__gt=now
             )
             
-            return Response({
-                'id': refresh_token.id,
-                'user_id': refresh_token.user.id,
-                'user_email': refresh_token.user.email,
-                'expires_at': refresh_token.expires_at,
+            payload = render_json({
+                'id': row['id'],
+                'user_id': row['user_id'],
+                'user_email': row['user__email'],
+                'expires_at': row['expires_at'],
                 'is_valid': True
             })
+            cache_refresh_token(token, row['user_id'], payload, row['expires_at'], now)
+            return json_response(payload)
         except RefreshToken.DoesNotExist:
             return Response({'is_valid': False}, status=status.HTTP_404_NOT_FOUND)
     
@@ -709,14 +960,16 @@ class RefreshTokenViewSet(viewsets.ModelViewSet):
         if not token:
             return Response({'error': 'token is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        try:
-            refresh_token = RefreshToken.objects.get(token=token)
-            refresh_token.is_active = False
-            refresh_token.save()
-            
-            return Response({'message': 'Token invalidated successfully'})
-        except RefreshToken.DoesNotExist:
+        # One UPDATE through the token hash index, which leaves already
+        # inactive rows unwritten; those still count as found so logging out
+        # twice is not an error
+        tokens = RefreshToken.objects.filter(token_hash=refresh_token_hash(token))
+        updated = tokens.filter(is_active=True).update(is_active=False)
+        transaction.on_commit(lambda: revoke_cached_refresh_token(token))
+        if not updated and not tokens.exists():
             return Response({'error': 'Token not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({'message': 'Token invalidated successfully'})
     
     @action(detail=False, methods=['post'])
     def invalidate_user_tokens(self, request):
@@ -726,6 +979,7 @@ class RefreshTokenViewSet(viewsets.ModelViewSet):
             return Response({'error': 'user_id is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         count = RefreshToken.objects.filter(user_id=user_id, is_active=True).update(is_active=False)
+        transaction.on_commit(lambda: revoke_cached_refresh_tokens(user_id))
         
         return Response({
             'message': f'Invalidated {count} tokens for user',
@@ -735,7 +989,9 @@ class RefreshTokenViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['delete'])
     def cleanup_expired(self, request):
         """Delete expired refresh tokens"""
-        count, _ = RefreshToken.objects.filter(expires_at__lt=timezone.now()).delete()
+        # The cleanup_expired_tokens worker runs the same sweep on a schedule;
+        # this stays for on-demand use
+        count = delete_expired_refresh_tokens()
         
         return Response({
             'message': f'Deleted {count} expired tokens',
@@ -744,9 +1000,24 @@ class RefreshTokenViewSet(viewsets.ModelViewSet):
 
 
 # RAG Embedding Views
-class RAGEmbeddingViewSet(viewsets.ModelViewSet):
+# Rows per INSERT / vector UPDATE statement; each row carries a full
+# embedding twice (JSON and vector), so statements stay moderately sized
+EMBEDDING_BATCH_SIZE = 100
+
+
+class RAGEmbeddingViewSet(AutoPrefetchViewSetMixin, viewsets.ModelViewSet):
     queryset = RAGEmbedding.objects.all()
     serializer_class = RAGEmbeddingSerializer
+    pagination_class = OptionalCursorPagination
+    
+    @property
+    def cursor_ordering(self):
+        # Within one document chunk_index is unique and keyset pages seek on
+        # the (document, chunk_index) index; unscoped listings page by
+        # creation time instead, on the created_at index
+        if self.request.query_params.get('document'):
+            return 'chunk_index'
+        return 'created_at'
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -758,6 +1029,19 @@ class RAGEmbeddingViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def list(self, request, *args, **kwargs):
+        """List embeddings; ?light=true returns only ids and chunk positions"""
+        if not is_truthy(request.query_params.get('light', 'false')):
+            return super().list(request, *args, **kwargs)
+        
+        # Callers that only count or index chunks skip the vectors, the
+        # chunk text and the serializer
+        queryset = self.filter_queryset(self.get_queryset()).values('id', 'document', 'chunk_index')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(queryset))
+    
     @action(detail=False, methods=['post'])
     def create_embedding(self, request):
         """Create a single embedding"""
@@ -809,25 +1093,41 @@ class RAGEmbeddingViewSet(viewsets.ModelViewSet):
                 document_id = serializer.validated_data['document_id']
                 document = RAGDocument.objects.get(file_id=document_id)
                 
-                created_embeddings = []
-                for chunk_data in serializer.validated_data['chunks']:
-                    embedding = RAGEmbedding.objects.create(
+                chunks = serializer.validated_data['chunks']
+                embeddings = [
+                    RAGEmbedding(
                         document=document,
                         chunk_index=chunk_data['chunk_index'],
                         chunk_text=chunk_data['chunk_text'],
                         embedding=chunk_data['embedding'],
                         metadata=chunk_data.get('metadata', {})
                     )
-                    created_embeddings.append(embedding)
+                    for chunk_data in chunks
+                ]
                 
-                # Bulk update vector column
-                from django.db import connection
-                with connection.cursor() as cursor:
-                    for i, embedding in enumerate(created_embeddings):
-                        cursor.execute(
-                            "UPDATE rag_embeddings SET embedding_vector = %s WHERE id = %s",
-                            [serializer.validated_data['chunks'][i]['embedding'], str(embedding.id)]
-                        )
+                with transaction.atomic():
+                    # Multi-row INSERTs instead of one per chunk; ids are
+                    # generated client-side so they are known afterwards
+                    created_embeddings = RAGEmbedding.objects.bulk_create(
+                        embeddings, batch_size=EMBEDDING_BATCH_SIZE
+                    )
+                    
+                    # Fill the vector column with one UPDATE ... FROM (VALUES ...) per batch
+                    with connection.cursor() as cursor:
+                        for start in range(0, len(created_embeddings), EMBEDDING_BATCH_SIZE):
+                            batch = created_embeddings[start:start + EMBEDDING_BATCH_SIZE]
+                            params = []
+                            for embedding in batch:
+                                params += [str(embedding.id), embedding.embedding]
+                            cursor.execute(
+                                "UPDATE rag_embeddings AS e SET embedding_vector = v.vec::vector "
+                                "FROM (VALUES " + ", ".join(["(%s::uuid, %s)"] * len(batch)) + ") AS v(id, vec) "
+                                "WHERE e.id = v.id",
+                                params
+                            )
+                # bulk_create skips post_save, so ?has_embeddings counts are
+                # invalidated here
+                bump_count_version(RAGDocument)
                 
                 return Response({
                     'message': f'Created {len(created_embeddings)} embeddings',
@@ -856,34 +1156,26 @@ class RAGEmbeddingViewSet(viewsets.ModelViewSet):
                 cancer_type_id = serializer.validated_data.get('cancer_type_id')
                 k = serializer.validated_data['k']
                 
-                # Build query with PGVector
-                from django.db import connection
-                
+                # Nearest neighbours come from the HNSW cosine index on
+                # embedding_vector; the query vector is sent once as a pgvector
+                # literal and the ORDER BY reuses the selected distance
+                query_vector = '[' + ','.join(map(str, query_embedding)) + ']'
+                where, params = '', [query_vector]
                 if cancer_type_id:
-                    query = """
-                        SELECT e.id, e.chunk_text, e.metadata, 
-                               e.embedding_vector <=> %s::vector as distance,
-                               d.file_id, f.filename
-                        FROM rag_embeddings e
-                        JOIN rag_documents d ON e.document_id = d.file_id
-                        JOIN file_metadata f ON d.file_id = f.id
-                        WHERE d.cancer_type_id = %s
-                        ORDER BY e.embedding_vector <=> %s::vector
-                        LIMIT %s
-                    """
-                    params = [query_embedding, cancer_type_id, query_embedding, k]
-                else:
-                    query = """
-                        SELECT e.id, e.chunk_text, e.metadata, 
-                               e.embedding_vector <=> %s::vector as distance,
-                               d.file_id, f.filename
-                        FROM rag_embeddings e
-                        JOIN rag_documents d ON e.document_id = d.file_id
-                        JOIN file_metadata f ON d.file_id = f.id
-                        ORDER BY e.embedding_vector <=> %s::vector
-                        LIMIT %s
-                    """
-                    params = [query_embedding, query_embedding, k]
+                    where = 'WHERE d.cancer_type_id = %s'
+                    params.append(cancer_type_id)
+                params.append(k)
+                query = f"""
+                    SELECT e.id, e.chunk_text, e.metadata, 
+                           e.embedding_vector <=> %s::vector as distance,
+                           d.file_id, f.filename
+                    FROM rag_embeddings e
+                    JOIN rag_documents d ON e.document_id = d.file_id
+                    JOIN file_metadata f ON d.file_id = f.id
+                    {where}
+                    ORDER BY distance
+                    LIMIT %s
+                """
                 
                 with connection.cursor() as cursor:
                     cursor.execute(query, params)
@@ -924,13 +1216,38 @@ class RAGEmbeddingViewSet(viewsets.ModelViewSet):
         return Response({'has_embeddings': exists})
 
 
-class RAGEmbeddingJobViewSet(viewsets.ModelViewSet):
-    queryset = RAGEmbeddingJob.objects.all()
+class RAGEmbeddingJobViewSet(AutoPrefetchViewSetMixin, viewsets.ModelViewSet):
+    # document_name is the only column the serializer needs from the file row
+    queryset = RAGEmbeddingJob.objects.select_related('document__file').only(
+        'id', 'document', 'status', 'message', 'created_at', 'updated_at',
+        'completed_at', 'retry_count', 'document__file__filename',
+    )
     serializer_class = RAGEmbeddingJobSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['document', 'status', 'id']
     ordering_fields = ['created_at', 'updated_at']
     ordering = ['-created_at']
+    pagination_class = OptionalCursorPagination
+    
+    def partial_update(self, request, *args, **kwargs):
+        """Apply a job progress update"""
+        # The embedding worker PATCHes on every progress step, so validate
+        # the sent fields and write just those columns in one UPDATE,
+        # without loading the row or re-serializing it afterwards
+        serializer = self.get_serializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        updates = dict(serializer.validated_data, updated_at=timezone.now())
+        
+        updated = RAGEmbeddingJob.objects.filter(pk=kwargs['pk']).update(**updates)
+        if not updated:
+            return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        fields = serializer.fields
+        return Response({
+            'id': kwargs['pk'],
+            **{name: fields[name].to_representation(value) if value is not None else None
+               for name, value in updates.items()},
+        })
     
     @action(detail=False, methods=['post'])
     def create_status(self, request):
@@ -969,14 +1286,19 @@ class RAGEmbeddingJobViewSet(viewsets.ModelViewSet):
     def update_status(self, request, pk=None):
         """Update job status"""
         try:
-            job = RAGEmbeddingJob.objects.get(id=pk)
+            # Loaded with the file name the response renders
+            job = self.get_queryset().get(id=pk)
             job.status = request.data.get('status', job.status)
             job.message = request.data.get('message', job.message)
+            update_fields = ['status', 'message', 'updated_at']
             
             if job.status == 'completed':
                 job.completed_at = timezone.now()
+                update_fields.append('completed_at')
             
-            job.save()
+            # Write only the columns this action changes, so a concurrent
+            # retry_count bump is not overwritten
+            job.save(update_fields=update_fields)
             
             return Response(RAGEmbeddingJobSerializer(job).data)
             
@@ -989,16 +1311,19 @@ class RAGEmbeddingJobViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Get embedding job statistics"""
-        from django.db.models import Count
-        
-        stats = RAGEmbeddingJob.objects.values('status').annotate(count=Count('status'))
+        stats = RAGEmbeddingJob.objects.order_by().values('status').annotate(count=Count('status'))
         
-        total_processed = RAGEmbedding.objects.values('document').distinct().count()
+        # Both embedding totals in one scan instead of a DISTINCT subquery
+        # count and a separate COUNT(*)
+        totals = RAGEmbedding.objects.aggregate(
+            total_documents_processed=Count('document', distinct=True),
+            total_embeddings=Count('id'),
+        )
         
         return Response({
             'job_stats': list(stats),
-            'total_documents_processed': total_processed,
-            'total_embeddings': RAGEmbedding.objects.count()
+            'total_documents_processed': totals['total_documents_processed'],
+            'total_embeddings': totals['total_embeddings']
         })
 
 
@@ -1010,9 +1335,13 @@ def check_document_embeddings(request, document_id):
     return Response({'has_embeddings': has_embeddings})
 
 
-class PatientAssignmentViewSet(viewsets.ModelViewSet):
-    queryset = PatientAssignment.objects.select_related('patient', 'cancer_subtype', 'assigned_clinician', 'updated_by').all()
+class PatientAssignmentViewSet(AutoPrefetchViewSetMixin, viewsets.ModelViewSet):
+    queryset = PatientAssignment.objects.defer('assigned_clinician__user__password', 'updated_by__password')
     serializer_class = PatientAssignmentSerializer
+    # Every *_detail field is a SerializerMethodField; patient is rendered as its id
+    extra_select_related = (
+        'cancer_subtype__parent', 'assigned_clinician__user', 'assigned_clinician__specialization', 'updated_by',
+    )
     
     @action(detail=False, methods=['get'])
     def by_patient(self, request):
@@ -1022,9 +1351,7 @@ class PatientAssignmentViewSet(viewsets.ModelViewSet):
             return Response({'error': 'patient_id parameter required'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            assignment = PatientAssignment.objects.select_related(
-                'patient', 'cancer_subtype', 'assigned_clinician', 'updated_by'
-            ).get(patient_id=patient_id)
+            assignment = self.get_queryset().get(patient_id=patient_id)
             serializer = self.get_serializer(assignment)
             return Response(serializer.data)
         except PatientAssignment.DoesNotExist:
@@ -1075,17 +1402,16 @@ class PatientAssignmentViewSet(viewsets.ModelViewSet):
             return Response({'error': 'patient_id and clinician_user_id are required'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            # Get clinician by user ID
-            clinician = Clinician.objects.get(user_id=clinician_user_id)
-            
-            # Check if patient is assigned to this clinician
-            assignment_exists = PatientAssignment.objects.filter(
-                patient_id=patient_id,
-                assigned_clinician=clinician
-            ).exists()
+            # Resolve the clinician and check the assignment in one query
+            clinician = Clinician.objects.annotate(
+                is_assigned=Exists(PatientAssignment.objects.filter(
+                    patient_id=patient_id,
+                    assigned_clinician=OuterRef('pk')
+                ))
+            ).only('id').get(user_id=clinician_user_id)
             
             return Response({
-                'is_assigned': assignment_exists,
+                'is_assigned': clinician.is_assigned,
                 'patient_id': patient_id,
                 'clinician_id': clinician.id,
                 'clinician_user_id': clinician_user_id
@@ -1108,12 +1434,17 @@ class MedicalRecordTypeViewSet(viewsets.ReadOnlyModelViewSet):
     
     def list(self, request):
         """List all active medical record types"""
-        types = self.get_queryset()
-        serializer = self.get_serializer(types, many=True)
-        return Response(serializer.data)
+        def load():
+            serializer = self.get_serializer(self.get_queryset(), many=True)
+            return render_json(serializer.data)
+        
+        payload = get_or_compute(
+            MEDICAL_RECORD_TYPE_LIST_CACHE_KEY, load, 3600, local_timeout=settings.LOCAL_CACHE_TTL
+        )
+        return json_response(payload, request=request)
 
 
-class MedicalRecordViewSet(viewsets.ModelViewSet):
+class MedicalRecordViewSet(AutoPrefetchViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet for medical records
     """
@@ -1123,6 +1454,11 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
     filterset_fields = ['patient', 'medical_record_type']
     ordering_fields = ['file__uploaded_at']
     ordering = ['-file__uploaded_at']
+    pagination_class = OptionalCursorPagination
+    # Keyset pages seek on the record's own indexed timestamp rather than a join
+    cursor_ordering = '-created_at'
+    # patient_detail and uploaded_by_detail are SerializerMethodFields
+    extra_select_related = ('patient', 'uploaded_by')
     
     def get_queryset(self):
         """Filter medical records by patient if specified"""
@@ -1130,7 +1466,7 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
         patient_id = self.request.query_params.get('patient_id')
         if patient_id:
             queryset = queryset.filter(patient_id=patient_id)
-        return queryset.select_related('file', 'patient', 'medical_record_type')
+        return queryset
     
     def create(self, request):
         """Create a new medical record"""
@@ -1152,7 +1488,7 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class MedicalRecordAccessViewSet(viewsets.ModelViewSet):
+class MedicalRecordAccessViewSet(AutoPrefetchViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing medical record access permissions
     """
@@ -1163,26 +1499,26 @@ class MedicalRecordAccessViewSet(viewsets.ModelViewSet):
         """Filter access records"""
         queryset = super().get_queryset()
         
+        # Collect the filters so the queryset is cloned once
+        conditions = Q()
+        
         # Filter by medical record
         medical_record_id = self.request.query_params.get('medical_record_id')
         if medical_record_id:
-            queryset = queryset.filter(medical_record_id=medical_record_id)
+            conditions &= Q(medical_record_id=medical_record_id)
         
         # Filter by user
         user_id = self.request.query_params.get('user_id')
         if user_id:
-            queryset = queryset.filter(user_id=user_id)
+            conditions &= Q(user_id=user_id)
         
         # Filter only active access
-        if self.request.query_params.get('active_only', 'true').lower() == 'true':
-            queryset = queryset.filter(revoked_at__isnull=True)
+        if is_truthy(self.request.query_params.get('active_only', 'true')):
             # Also check expiry
             now = timezone.now()
-            queryset = queryset.filter(
-                Q(expires_at__isnull=True) | Q(expires_at__gt=now)
-            )
+            conditions &= Q(revoked_at__isnull=True) & (Q(expires_at__isnull=True) | Q(expires_at__gt=now))
         
-        return queryset.select_related('medical_record', 'user', 'granted_by')
+        return queryset.filter(conditions)
     
     def create(self, request):
         """Grant access to a medical record"""
@@ -1227,8 +1563,37 @@ class ChatViewSet(viewsets.ViewSet):
         patient_id = request.query_params.get('patient_id')
         if not patient_id:
             return Response({'error': 'patient_id is required'}, status=status.HTTP_400_BAD_REQUEST)
-        sessions = ChatSession.objects.filter(patient_id=patient_id).order_by('-created_at')
-        return Response(ChatSessionSerializer(sessions, many=True).data)
+        try:
+            patient_id = int(patient_id)
+        except ValueError:
+            return Response({'error': 'patient_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        cache_key = chat_sessions_key(patient_id)
+        payload = cache.get(cache_key)
+        if payload is None:
+            # Sessions and all of their messages in two queries, rendered in
+            # ChatSessionSerializer's shape without instantiating models
+            sessions = list(ChatSession.objects.filter(patient_id=patient_id).order_by('-created_at').values(
+                'id', 'patient_id', 'title', 'created_at', 'suggestions'
+            ))
+            messages = {session['id']: [] for session in sessions}
+            for message in ChatMessage.objects.filter(session__patient_id=patient_id).order_by('timestamp').values(
+                'id', 'session_id', 'role', 'content', 'timestamp'
+            ):
+                messages[message['session_id']].append(message)
+            payload = render_json([
+                {
+                    'id': session['id'],
+                    'patient_id': session['patient_id'],
+                    'title': session['title'],
+                    'created_at': session['created_at'],
+                    'messages': messages[session['id']],
+                    'suggestions': session['suggestions'],
+                }
+                for session in sessions
+            ])
+            cache.set(cache_key, payload, 60)
+        return json_response(payload, request=request)
 
     @action(detail=False, methods=['post'])
     def start(self, request):
@@ -1320,7 +1685,10 @@ class ChatViewSet(viewsets.ViewSet):
         # templates are global; no ownership check
         ct = (request.query_params.get('cancer_type') or '').strip().lower()
         qs = SuggestionTemplate.objects.filter(cancer_type=ct) if ct else SuggestionTemplate.objects.all()
-        return Response(SuggestionTemplateSerializer(qs, many=True).data, status=200)
+        # Every template carries its embedding, so stream plain rows rather
+        # than serializing the whole catalog in memory
+        rows = qs.order_by('id').values('id', 'cancer_type', 'text', 'embedding_json')
+        return streaming_json_response(rows.iterator(chunk_size=500))
 
     @action(detail=False, methods=['get', 'post'], url_path='internal/suggestions/history',
             permission_classes=[permissions.IsAuthenticated])
@@ -1358,11 +1726,21 @@ class ChatViewSet(viewsets.ViewSet):
             return Response({'error':'items must be a list'}, status=400)
 
         # (No session ownership required here; it’s template data.)
-        updated = 0
+        # Key the embeddings by id so each template's lookup is O(1)
+        embeddings = {}
         for it in items:
             sid = it.get('id'); emb = it.get('embedding')
-            if sid is None or emb is None: 
+            if sid is None or emb is None:
                 continue
-            SuggestionTemplate.objects.filter(id=sid).update(embedding_json=emb)
-            updated += 1
-        return Response({'updated': updated}, status=200)
+            try:
+                embeddings[int(sid)] = emb
+            except (TypeError, ValueError):
+                continue
+
+        # One SELECT for the existing templates and one CASE UPDATE per batch,
+        # instead of an UPDATE per item
+        templates = SuggestionTemplate.objects.only('id').in_bulk(list(embeddings))
+        for template in templates.values():
+            template.embedding_json = embeddings[template.pk]
+        SuggestionTemplate.objects.bulk_update(templates.values(), ['embedding_json'], batch_size=100)
+        return Response({'updated': len(templates)}, status=200)
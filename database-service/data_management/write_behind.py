@@ -0,0 +1,154 @@
+"""
+Write-behind queues for append-only log tables.
+
+Request handlers push validated rows onto a Redis list and return; the
+``process_log_queues`` management command drains each list and inserts
+rows in batches, so log writes never hold up the calling service. Rows
+are stamped when they are queued, not when they are inserted.
+
+A batch is moved atomically onto ``<queue>:processing`` and only removed
+from there once its insert has committed, so a worker that dies mid-batch
+leaves it to be retried on restart. Delivery is at-least-once (a crash
+between the commit and the removal inserts the batch again), and each
+queue must have a single consumer.
+
+File ``last_accessed`` bumps are coalesced the same way: a sorted set keeps
+the latest access time per file and the worker writes them back in one
+batched UPDATE, so a burst of downloads costs one row write per file.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+
+from django.db import DatabaseError, IntegrityError, transaction
+from django_redis import get_redis_connection
+
+from .models import EventLog, FileAccessLog, FileMetadata
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOG_QUEUE = 'event_log_queue'
+ACCESS_LOG_QUEUE = 'access_log_queue'
+QUEUE_MODELS = {
+    EVENT_LOG_QUEUE: EventLog,
+    ACCESS_LOG_QUEUE: FileAccessLog,
+}
+# Set at enqueue time so a row's timestamp is the event's, not the drain's
+QUEUE_TIMESTAMP_FIELDS = {
+    EVENT_LOG_QUEUE: 'created_at',
+    ACCESS_LOG_QUEUE: 'accessed_at',
+}
+LAST_ACCESSED_SET = 'file_last_accessed'
+DRAIN_CHUNK_SIZE = 500
+INSERT_BATCH_SIZE = 100
+
+
+def enqueue(queue, row):
+    """Queue a row for ``queue``'s model; returns False if Redis is unavailable."""
+    row = {QUEUE_TIMESTAMP_FIELDS[queue]: datetime.now(timezone.utc).isoformat(), **row}
+    try:
+        get_redis_connection('default').rpush(queue, json.dumps(row, default=str))
+        return True
+    except Exception as e:
+        logger.warning(f"Write-behind queue {queue} unavailable, writing synchronously: {e}")
+        return False
+
+
+def enqueue_event(event):
+    return enqueue(EVENT_LOG_QUEUE, event)
+
+
+def log_file_access(**fields):
+    """Record a FileAccessLog row, through the queue when Redis is reachable."""
+    if not enqueue(ACCESS_LOG_QUEUE, fields):
+        FileAccessLog.objects.create(**fields)
+
+
+def touch_file(file_id, accessed_at):
+    """Record a file access time for the worker; returns False if Redis is unavailable."""
+    try:
+        # GT keeps the newest time when accesses are reported out of order
+        get_redis_connection('default').zadd(
+            LAST_ACCESSED_SET, {str(file_id): accessed_at.timestamp()}, gt=True
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Last-accessed buffer unavailable, writing synchronously: {e}")
+        return False
+
+
+def flush_last_accessed(limit=DRAIN_CHUNK_SIZE):
+    """Write up to ``limit`` buffered access times and return how many were taken."""
+    redis = get_redis_connection('default')
+    pipe = redis.pipeline()
+    pipe.zrange(LAST_ACCESSED_SET, 0, limit - 1, withscores=True)
+    pipe.zremrangebyrank(LAST_ACCESSED_SET, 0, limit - 1)
+    items, _ = pipe.execute()
+    if not items:
+        return 0
+
+    files = [
+        FileMetadata(pk=file_id.decode(), last_accessed=datetime.fromtimestamp(ts, tz=timezone.utc))
+        for file_id, ts in items
+    ]
+    try:
+        # One UPDATE ... CASE per batch; rows deleted meanwhile just match nothing
+        FileMetadata.objects.bulk_update(files, ['last_accessed'], batch_size=INSERT_BATCH_SIZE)
+    except DatabaseError:
+        redis.zadd(LAST_ACCESSED_SET, {file_id: ts for file_id, ts in items}, gt=True)
+        raise
+    return len(items)
+
+
+def _insert_individually(model, items):
+    """Fallback when a batch fails: keep the good rows, drop rows that can never insert."""
+    retry = []
+    for item in items:
+        try:
+            with transaction.atomic():
+                model.objects.create(**json.loads(item))
+        except IntegrityError as e:
+            logger.error(f"Dropping queued {model.__name__} row {item!r}: {e}")
+        except DatabaseError:
+            retry.append(item)
+    return retry
+
+
+def processing_list(queue):
+    return f'{queue}:processing'
+
+
+def drain(queue, limit=DRAIN_CHUNK_SIZE):
+    """Insert up to ``limit`` queued rows and return how many were taken off the queue."""
+    model = QUEUE_MODELS[queue]
+    redis = get_redis_connection('default')
+    processing = processing_list(queue)
+    # A batch left over from a worker that died mid-insert goes first
+    items = redis.lrange(processing, 0, -1)
+    if not items:
+        # Each LMOVE is atomic, so a row is always on one list or the other;
+        # the batch still costs a single round trip
+        pipe = redis.pipeline(transaction=False)
+        for _ in range(min(limit, redis.llen(queue))):
+            pipe.lmove(queue, processing, 'LEFT', 'RIGHT')
+        items = [item for item in pipe.execute() if item is not None]
+    if not items:
+        return 0
+
+    try:
+        model.objects.bulk_create(
+            [model(**json.loads(item)) for item in items],
+            batch_size=INSERT_BATCH_SIZE,
+        )
+    except DatabaseError:
+        retry = _insert_individually(model, items)
+        if retry:
+            # Keep only what could not be written for the next attempt
+            pipe = redis.pipeline()
+            pipe.delete(processing)
+            pipe.rpush(processing, *retry)
+            pipe.execute()
+            raise
+    # Acknowledge only once the rows are committed
+    redis.delete(processing)
+    return len(items)